@@ -1,78 +1,117 @@
 from fastapi import APIRouter, Depends, Response, Query, Request
+from fastapi.responses import PlainTextResponse
 
 from app.api.dependencies import get_auth_service, get_email_service, get_token_service, \
     get_refresh_token_from_req, get_current_auth_user, get_current_verified_user, \
-    get_current_unverified_user, get_key_manager, get_current_admin_user
+    get_current_unverified_user, get_key_manager, get_current_admin_user, get_access_token_claims, rate_limit, \
+    get_client_ip, verify_introspection_secret, user_rate_limit
 from app.exceptions import VerificationTokenExpired, InvalidCredentials, \
-    RegistrationFailed, InvalidEmail
+    RegistrationFailed, InvalidEmail, ProfileNotFound
 from app.models.users import User
 
 from app.schemas import RegisterRequest, LoginRequest, ChangePasswordRequest, MessageResponse, \
-    ChangeEmailRequest, TokensResponse
+    ChangeEmailRequest, TokensResponse, IntrospectRequest, IntrospectResponse
 from app.services.auth_service import AuthService
 from app.services.email_service import EmailService
+from app.services.login_throttle import login_throttle
+from app.services.request_profiles import request_profiles
 from app.services.token_service import TokenService
-from app.utils.helpers import clear_token_cookies
+from app.utils.helpers import clear_token_cookies, create_email_verification_token
 from app.utils.key_manager import KeyManager
 
 auth_router = APIRouter(prefix="/auth", tags=["Auth-service"], )
 
 
 @auth_router.post("/register", response_model=TokensResponse,
+                  dependencies=[Depends(rate_limit("register"))],
                   summary="Register a new user",
                   description="Creates a new user with the specified email, password, and optional fullname. "
                               "After successful registration, a verification email is sent to the provided email address.")
 async def register_user(user_data: RegisterRequest,
+                        request: Request,
                         response: Response,
                         auth_service: AuthService = Depends(get_auth_service),
                         email_service: EmailService = Depends(get_email_service),
                         token_service: TokenService = Depends(get_token_service)):
+    # Письмо с верификацией сохраняется в email_outbox в одной транзакции с пользователем
+    verification_token = create_email_verification_token()
+    verification_email = email_service.build_email_verification(user_data.email, verification_token)
     user = await auth_service.register_user(email=user_data.email,
                                             password=user_data.password,
-                                            fullname=user_data.fullname)
+                                            fullname=user_data.fullname,
+                                            outbox_messages=[verification_email])
     if not user:
         raise RegistrationFailed
 
-    await email_service.send_email_verification(user_data.email)
+    await email_service.save_email_verification_token(user_data.email, verification_token)
 
-    access, refresh = await token_service.generate_tokens_cookies(user.id, response)
+    access, refresh = await token_service.generate_tokens_cookies(user.id, response,
+                                                                  user_agent=request.headers.get("user-agent"))
     return TokensResponse(access_token=access, refresh_token=refresh,
                           message="You were successfully registrated. Please verify your email", )
 
 
 @auth_router.post("/login", response_model=TokensResponse,
+                  dependencies=[Depends(rate_limit("login"))],
                   summary="User login",
                   description="Authenticates a user using email and password. "
                               "Returns access and refresh tokens, which are also set in cookies.")
 async def login_user(user_data: LoginRequest,
+                     request: Request,
                      response: Response,
                      auth_service: AuthService = Depends(get_auth_service),
                      token_service: TokenService = Depends(get_token_service)):
+    # Вход, заблокированный после серии неудач, отклоняется до запроса в БД и проверки пароля
+    client_ip = get_client_ip(request)
+    await login_throttle.check(user_data.email, client_ip)
+
     user = await auth_service.login_user(email=user_data.email, password=user_data.password)
     if not user:
+        await login_throttle.register_failure(user_data.email, client_ip)
         raise InvalidCredentials
+    await login_throttle.reset(user_data.email)
 
-    access, refresh = await token_service.generate_tokens_cookies(user.id, response)
+    access, refresh = await token_service.generate_tokens_cookies(user.id, response,
+                                                                  user_agent=request.headers.get("user-agent"))
     return TokensResponse(access_token=access, refresh_token=refresh,
                           message="You have successfully entered your account")
 
 
 @auth_router.post("/logout", response_model=MessageResponse,
                   summary="Logout",
-                  description="Removes tokens from cookies and revokes the user's refresh token.")
+                  description="Removes tokens from cookies, revokes the access token "
+                              "and the refresh token of the current session.")
 async def logout_user(response: Response,
                       request: Request,
                       current_user: User = Depends(get_current_auth_user),
+                      access_token_claims: dict = Depends(get_access_token_claims),
                       token_service: TokenService = Depends(get_token_service)):
     # Проверка аутентификации пользователя выполняется через зависимость get_current_auth_user
     refresh_token = get_refresh_token_from_req(request)
     await token_service.revoke_refresh_token(refresh_token)
+    await token_service.revoke_access_token(access_token_claims)
 
     clear_token_cookies(response)
 
     return MessageResponse(message="User logged out successfully")
 
 
+@auth_router.post("/logout-all", response_model=MessageResponse,
+                  summary="Logout from all devices",
+                  description="Removes tokens from cookies and revokes refresh tokens of all the user's sessions.")
+async def logout_all_sessions(response: Response,
+                              current_user: User = Depends(get_current_auth_user),
+                              access_token_claims: dict = Depends(get_access_token_claims),
+                              token_service: TokenService = Depends(get_token_service)):
+    # Все сессии пользователя удаляются одним запросом
+    await token_service.revoke_all_sessions(current_user.id)
+    await token_service.revoke_access_token(access_token_claims)
+
+    clear_token_cookies(response)
+
+    return MessageResponse(message="User logged out from all devices successfully")
+
+
 @auth_router.post("/change-password", response_model=MessageResponse,
                   summary="Change password",
                   description="Allows an authorized and verified user to change their password. "
@@ -85,10 +124,10 @@ async def change_password(user_data: ChangePasswordRequest,
     if user_data.email != current_user.email:
         raise InvalidEmail
 
-    await auth_service.change_password(user_data.email, user_data.old_password, user_data.new_password)
-
-    # Отправка уведомления о смене пароля
-    await email_service.send_password_change_notification(user_data.email)
+    # Уведомление о смене пароля сохраняется в email_outbox вместе с новым паролем
+    await auth_service.change_password(user_data.email, user_data.old_password, user_data.new_password,
+                                       outbox_messages=[
+                                           email_service.build_password_change_notification(user_data.email)])
 
     return MessageResponse(message="Password changed successfully.")
 
@@ -104,25 +143,32 @@ async def change_email(user_data: ChangeEmailRequest,
     if user_data.current_email != current_user.email:
         raise InvalidEmail
 
+    # Уведомление на старый email и письмо с верификацией на новый сохраняются в email_outbox
+    # в одной транзакции со сменой почты
+    verification_token = create_email_verification_token()
+    outbox_messages = [
+        email_service.build_email_change_notification(user_data.current_email, user_data.new_email),
+        email_service.build_email_verification(user_data.new_email, verification_token),
+    ]
+
     # Изменение email и сброс статуса верификации
-    await auth_service.change_email(user_data.password, user_data.current_email, user_data.new_email)
+    await auth_service.change_email(user_data.password, user_data.current_email, user_data.new_email,
+                                    outbox_messages=outbox_messages)
 
-    # Отправка уведомления на старый email о смене почты
-    await email_service.send_email_change_notification(user_data.current_email, user_data.new_email)
-    # Отправка письма с верификацией на новый email
-    await email_service.send_email_verification(user_data.new_email)
+    await email_service.save_email_verification_token(user_data.new_email, verification_token)
 
     return MessageResponse(message="Email successfully changed.")
 
 
 @auth_router.post("/send-verification-email", response_model=MessageResponse,
+                  dependencies=[Depends(user_rate_limit("send_verification_email", get_current_unverified_user))],
                   summary="Send email verification",
                   description="Sends an email with a verification token to users "
                               "whose accounts are not yet verified.")
 async def send_verification_email(email: str,
                                   email_service: EmailService = Depends(get_email_service),
                                   current_user: User = Depends(get_current_unverified_user)):
-    # НУЖНО ОГРАНИЧИТЬ ВОЗМОЖНОСТЬ ОТПРАВКИ ЗАПРОСА, ВОЗМОЖНО ЧЕРЕЗ nginx
+    # Частота отправки ограничена зависимостью user_rate_limit по IP и email пользователя (после авторизации)
     # Проверка отсутствия верификации пользователя выполняется через зависимость get_current_unverified_user
     if email != current_user.email:
         raise InvalidEmail
@@ -161,8 +207,32 @@ async def protected_verify_endpoint(current_user: User = Depends(get_current_ver
     return MessageResponse(message="You have access to verified endpoint")
 
 
+@auth_router.post("/introspect", response_model=IntrospectResponse,
+                  dependencies=[Depends(rate_limit("introspect")), Depends(verify_introspection_secret)],
+                  summary="Introspect access tokens",
+                  description="Checks a batch of access tokens for other services. For each token returns "
+                              "whether it is active, its claims and the owner's status, in the request order. "
+                              "Requires the X-Introspection-Secret header; disabled when no secret is configured.")
+async def introspect_tokens(data: IntrospectRequest,
+                            token_service: TokenService = Depends(get_token_service)):
+    # Подписи проверяются локально, владельцы всех токенов загружаются одним запросом
+    results = await token_service.introspect_access_tokens(data.tokens)
+    return IntrospectResponse(results=results)
+
+
 @auth_router.post("/rotate-keys", summary="Rotate JWT keys")
 async def rotate_keys(key_manager: KeyManager = Depends(get_key_manager),
                       current_admin_user: User = Depends(get_current_admin_user)):
     key_manager.rotate_keys()
     return MessageResponse(message="🔑 Ключи успешно обновлены")
+
+
+@auth_router.get("/profiles/{profile_id}", response_class=PlainTextResponse,
+                 summary="Get request profile",
+                 description="Returns the sampling profile of a request made with the X-Profile header "
+                             "in folded stacks format (flamegraph.pl, speedscope). Admins only.")
+async def get_request_profile(profile_id: str, current_admin_user: User = Depends(get_current_admin_user)):
+    folded_stacks = await request_profiles.get(profile_id)
+    if folded_stacks is None:
+        raise ProfileNotFound
+    return PlainTextResponse(folded_stacks)
@@ -1,26 +1,37 @@
 # app/dependencies.py
-from fastapi import Request, Depends, Response
+import hmac
+from typing import AsyncIterator, Awaitable, Callable, Optional
 
+from fastapi import Request, Depends, Response, Header
+
+from app.config import settings
 from app.exceptions import TokenMissing, TokenInvalid, UserNotExist, UserNotVerified, UserAlreadyVerified, \
-    ForbiddenAccess
+    ForbiddenAccess, IntrospectionDisabled
+from app.db.unit_of_work import UnitOfWork
 from app.models.users import User
 from app.repositories.redisRepository import RedisRepository
-from app.repositories.tokensRepo import TokensRepository
-from app.repositories.usersRepo import UsersRepository
 from app.services.auth_service import AuthService
 from app.services.email_service import EmailService
+from app.services.rate_limiter import rate_limiter
 from app.services.token_service import TokenService
-from app.utils.crypto import decode_token_with_public_keys
+from app.tracing import span
+from app.utils.constants import ROLE_ADMIN_ID
 from app.utils.helpers import set_token_cookie
-from app.utils.key_manager import KeyManager
+from app.utils.key_manager import KeyManager, key_manager
+
+
+async def get_unit_of_work() -> AsyncIterator[UnitOfWork]:
+    """Одна сессия БД на запрос: все сервисы запроса получают один и тот же UnitOfWork"""
+    async with UnitOfWork() as uow:
+        yield uow
 
 
-def get_auth_service() -> AuthService:
-    return AuthService(UsersRepository())
+def get_auth_service(uow: UnitOfWork = Depends(get_unit_of_work)) -> AuthService:
+    return AuthService(uow)
 
 
-def get_token_service() -> TokenService:
-    return TokenService(TokensRepository())
+def get_token_service(uow: UnitOfWork = Depends(get_unit_of_work)) -> TokenService:
+    return TokenService(uow)
 
 
 def get_email_service() -> EmailService:
@@ -28,7 +39,48 @@ def get_email_service() -> EmailService:
 
 
 def get_key_manager() -> KeyManager:
-    return KeyManager()
+    return key_manager
+
+
+def get_client_ip(request: Request) -> str | None:
+    if settings.RATE_LIMIT_TRUST_FORWARDED_FOR:
+        forwarded_for = request.headers.get("x-forwarded-for")
+        if forwarded_for:
+            return forwarded_for.split(",")[0].strip()
+    return request.client.host if request.client else None
+
+
+async def get_request_email(request: Request) -> str | None:
+    """Email из query-параметра или JSON-тела запроса (тело уже прочитано FastAPI и закэшировано)"""
+    email = request.query_params.get("email")
+    if email or request.headers.get("content-type", "").split(";")[0] != "application/json":
+        return email
+    try:
+        body = await request.json()
+    except ValueError:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email if isinstance(email, str) else None
+
+
+def rate_limit(route: str):
+    """Зависимость, ограничивающая частоту запросов к маршруту по IP и email (лимиты — RATE_LIMIT_* в настройках)"""
+
+    async def check_rate_limit(request: Request) -> None:
+        with span("rate_limit"):
+            await rate_limiter.check(route, ip=get_client_ip(request), email=await get_request_email(request))
+
+    return check_rate_limit
+
+
+def verify_introspection_secret(x_introspection_secret: Optional[str] = Header(default=None)) -> None:
+    """Интроспекция доступна только сервисам, знающим INTROSPECTION_SECRET. Без секрета эндпоинт закрыт:
+    иначе любой владелец токена получал бы email и роль его владельца"""
+    if not settings.INTROSPECTION_SECRET:
+        raise IntrospectionDisabled
+    if not x_introspection_secret or not hmac.compare_digest(x_introspection_secret.encode(),
+                                                             settings.INTROSPECTION_SECRET.encode()):
+        raise ForbiddenAccess
 
 
 def get_refresh_token_from_req(request: Request) -> str:
@@ -50,22 +102,29 @@ async def get_access_token_from_req(request: Request,
     if not refresh_token:
         raise TokenMissing  # Ни одного токена нет — кидаем исключение
 
-    # Пытаемся обновить access_token
-    new_access_token = await token_service.refresh_access_token(refresh_token)
+    # Пытаемся обновить токены: refresh-токен меняется при каждом использовании
+    new_access_token, new_refresh_token = await token_service.refresh_tokens(refresh_token)
 
     set_token_cookie(response, "access", new_access_token)
+    if new_refresh_token is not None:  # иначе refresh-cookie обновит параллельный запрос, выполнивший ротацию
+        set_token_cookie(response, "refresh", new_refresh_token)
     return new_access_token
 
 
-async def get_current_auth_user(access_token: str = Depends(get_access_token_from_req),
-                                auth_service: AuthService = Depends(get_auth_service),
-                                key_manager: KeyManager = Depends(get_key_manager)) -> User | None:
-    access_public_keys = key_manager.get_access_public_keys()
-    decoded_access_token = decode_token_with_public_keys(access_token, access_public_keys)
-    user_id = int(decoded_access_token.get("user_id"))
-    if not decoded_access_token or not user_id:
+async def get_access_token_claims(access_token: str = Depends(get_access_token_from_req),
+                                  token_service: TokenService = Depends(get_token_service)) -> dict:
+    with span("auth.verify_token"):
+        decoded_access_token = token_service.decode_access_token(access_token)
+        await token_service.check_access_token_revoked(decoded_access_token)
+    return decoded_access_token
+
+
+async def get_current_auth_user(decoded_access_token: dict = Depends(get_access_token_claims),
+                                auth_service: AuthService = Depends(get_auth_service)) -> User | None:
+    user_id = decoded_access_token.get("user_id")
+    if not user_id:
         raise TokenInvalid
-    user = await auth_service.users_repository.find_by_id(user_id)
+    user = await auth_service.users_repository.find_by_id(int(user_id))
     if not user:
         raise UserNotExist
     return user
@@ -84,11 +143,22 @@ async def get_current_unverified_user(user: User = Depends(get_current_auth_user
 
 
 async def get_current_admin_user(user: User = Depends(get_current_auth_user)) -> User:
-    if user.role_id == 2:
+    if user.role_id == ROLE_ADMIN_ID:
         return user
     raise ForbiddenAccess
 
 
+def user_rate_limit(route: str, get_user: Callable[..., Awaitable[User]] = get_current_auth_user):
+    """rate_limit для маршрутов с авторизацией: проверяется после неё, email берётся у текущего пользователя,
+    а не из запроса — запрос без токена не расходует чужой лимит"""
+
+    async def check_user_rate_limit(request: Request, user: User = Depends(get_user)) -> None:
+        with span("rate_limit"):
+            await rate_limiter.check(route, ip=get_client_ip(request), email=user.email)
+
+    return check_user_rate_limit
+
+
 """def verify_tokens_in_cookies(request: Request, key_manager: KeyManager = Depends(get_key_manager)):
     access_token = get_access_token_from_req(request)
     refresh_token = get_refresh_token_from_req(request)
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Response
+
+from app.metrics import generate_metrics
+
+metrics_router = APIRouter(tags=["Metrics"])
+
+
+@metrics_router.get("/metrics", response_class=Response, include_in_schema=False)
+def get_metrics():
+    # Синхронный обработчик выполняется в пуле потоков: в multiprocess-режиме читаются файлы всех воркеров
+    body, content_type = generate_metrics()
+    return Response(content=body, media_type=content_type)
@@ -35,10 +35,12 @@ async def oauth_callback(provider: str, request: Request, response: Response,
     token = await client.authorize_access_token(request)
 
     userinfo = await client.userinfo(token=token)
-    logger.info(f"OAuth userinfo entered: {userinfo}")
+    # Сам userinfo (email, имя) в лог не пишется
+    logger.info("OAuth userinfo received from %s", provider)
 
     user = await auth_service.login_or_register_oauth_user(provider, userinfo)
-    access, refresh = await token_service.generate_tokens_cookies(user.id, response)
+    access, refresh = await token_service.generate_tokens_cookies(user.id, response,
+                                                                  user_agent=request.headers.get("user-agent"))
 
     return TokensResponse(access_token=access, refresh_token=refresh,
                           message="You have successfully entered your account")
@@ -0,0 +1,31 @@
+from fastapi import APIRouter, Depends, Request, Response, status
+
+from app.api.dependencies import get_key_manager
+from app.config import settings
+from app.utils.key_manager import KeyManager
+
+well_known_router = APIRouter(prefix="/.well-known", tags=["Well-known"])
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """Сравнение для If-None-Match (RFC 9110): список тегов или *, префикс W/ не учитывается"""
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+@well_known_router.get("/jwks.json", response_class=Response,
+                       summary="JSON Web Key Set",
+                       description="Public keys for verifying access tokens locally: the current key and the "
+                                   "previous ones still accepted after rotation, identified by kid. "
+                                   "If a token has an unknown kid, the set should be fetched again.")
+async def get_jwks(request: Request, key_manager: KeyManager = Depends(get_key_manager)):
+    # Тело и ETag готовятся при смене ключей, здесь только сравнение заголовков
+    body, etag = key_manager.get_access_jwks()
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE_SECONDS}"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
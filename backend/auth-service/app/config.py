@@ -3,30 +3,113 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     LOG_LEVEL: str
+    LOG_QUEUE_SIZE: int = 10000  # при переполнении записи отбрасываются, а не блокируют запрос
+    LOG_RATE_LIMIT_PER_KEY: int = 100  # сообщений с одним шаблоном за окно, 0 — без ограничения
+    LOG_RATE_LIMIT_WINDOW_SECONDS: float = 10
+    LOG_SAMPLE_RATES: dict[str, float] = {}  # {шаблон сообщения: доля} для DEBUG/INFO, JSON в переменной окружения
+    METRICS_ENABLED: bool = True  # GET /metrics и замер времени запросов
+    TRACING_ENABLED: bool = True  # тайминги этапов запроса
+    TRACING_SLOW_REQUEST_MS: int = 1000  # запросы дольше пишутся в лог со спанами
+    SERVER_TIMING_ENABLED: bool = False  # Server-Timing для всех запросов: раскрывает этапы (был ли bcrypt)
+    PROFILER_ENABLED: bool = True  # профилирование запросов администратора по заголовку X-Profile
+    PROFILER_INTERVAL_MS: float = 2
+    PROFILER_MAX_SECONDS: float = 30
+    PROFILE_TTL_SECONDS: int = 600
     DB_HOST: str
     DB_PORT: int
     DB_USER: str
     DB_PASS: str
     DB_NAME: str
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: int = 30
 
     REDIS_URL: str
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: int = 5  # сколько ждать свободного соединения из пула
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30
+    REDIS_SOCKET_TIMEOUT: float = 5
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5
+
+    USER_CACHE_ENABLED: bool = True
+    USER_CACHE_LOCAL_TTL_SECONDS: int = 30
+    USER_CACHE_REDIS_TTL_SECONDS: int = 300
+    USER_CACHE_LOCAL_MAX_SIZE: int = 10000
+    USER_CACHE_TOMBSTONE_SECONDS: int = 10  # после инвалидации строки, прочитанные раньше неё, не кэшируются
 
     SMTP_HOST: str
     SMTP_PORT: str
     SMTP_SENDER: str
     SMTP_PASSWORD: str
+    SMTP_USE_TLS: bool = True
+    SMTP_TIMEOUT_SECONDS: int = 30
+
+    EMAIL_WORKERS: int = 2
+    EMAIL_QUEUE_MAX_SIZE: int = 1000
+    EMAIL_MAX_RETRIES: int = 3
+    EMAIL_RETRY_BACKOFF_SECONDS: float = 1
+    EMAIL_SHUTDOWN_TIMEOUT_SECONDS: int = 10
+
+    EMAIL_OUTBOX_BATCH_SIZE: int = 50
+    EMAIL_OUTBOX_POLL_INTERVAL_SECONDS: float = 2
+    EMAIL_OUTBOX_LEASE_SECONDS: int = 60  # через сколько взятое, но не отправленное письмо снова доступно
+    EMAIL_OUTBOX_MAX_ATTEMPTS: int = 5
+
+    MAINTENANCE_ENABLED: bool = True  # периодическая очистка в lifespan; на всех репликах работает только одна
+    MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    MAINTENANCE_JITTER_SECONDS: int = 300
+    MAINTENANCE_BATCH_SIZE: int = 1000
+    MAINTENANCE_BATCH_PAUSE_SECONDS: float = 0.1
+    UNVERIFIED_USER_RETENTION_DAYS: int = 30
+    EMAIL_OUTBOX_RETENTION_DAYS: int = 7
+
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_TRUST_FORWARDED_FOR: bool = False  # брать IP клиента из X-Forwarded-For (сервис за прокси)
+    RATE_LIMIT_LOGIN_PER_IP: int = 30
+    RATE_LIMIT_LOGIN_PER_EMAIL: int = 10
+    RATE_LIMIT_LOGIN_WINDOW_SECONDS: int = 60
+    RATE_LIMIT_REGISTER_PER_IP: int = 10
+    RATE_LIMIT_REGISTER_PER_EMAIL: int = 3
+    RATE_LIMIT_REGISTER_WINDOW_SECONDS: int = 3600
+    RATE_LIMIT_VERIFICATION_EMAIL_PER_IP: int = 10
+    RATE_LIMIT_VERIFICATION_EMAIL_PER_EMAIL: int = 3
+    RATE_LIMIT_VERIFICATION_EMAIL_WINDOW_SECONDS: int = 900
+    RATE_LIMIT_INTROSPECT_PER_IP: int = 600
+    RATE_LIMIT_INTROSPECT_WINDOW_SECONDS: int = 60
+
+    LOGIN_THROTTLE_ENABLED: bool = True
+    LOGIN_THROTTLE_EMAIL_MAX_FAILURES: int = 5  # неудач подряд до первой блокировки аккаунта
+    LOGIN_THROTTLE_IP_MAX_FAILURES: int = 20
+    LOGIN_THROTTLE_BASE_LOCKOUT_SECONDS: int = 30  # удваивается с каждой следующей неудачей
+    LOGIN_THROTTLE_MAX_LOCKOUT_SECONDS: int = 900
+    LOGIN_THROTTLE_FAILURE_WINDOW_SECONDS: int = 3600  # через сколько без неудач счётчик обнуляется
 
     VERIFICATION_TOKEN_EXPIRE_TIME_MINUTES: str
 
     ACCESS_TOKEN_EXPIRE_TIME_MINUTES: str
+    ACCESS_TOKEN_CACHE_ENABLED: bool = False
+    ACCESS_TOKEN_CACHE_MAX_SIZE: int = 10000
+    ACCESS_TOKEN_REVOCATION_ENABLED: bool = True
+    REVOCATION_FILTER_CAPACITY: int = 100000
+    REVOCATION_FILTER_ERROR_RATE: float = 0.001
+    REVOCATION_FILTER_REBUILD_INTERVAL_SECONDS: int = 600  # пересборка убирает из фильтра истёкшие jti
+    INTROSPECTION_SECRET: str = ""  # /auth/introspect требует его в X-Introspection-Secret; пустой — эндпоинт закрыт
+    INTROSPECTION_MAX_TOKENS: int = 100
     ACCESS_PRIVATE_KEY: str
     ACCESS_PUBLIC_KEY: str
     PREVIOUS_ACCESS_PUBLIC_KEY: str
 
     REFRESH_TOKEN_EXPIRE_TIME_MINUTES: str
+    REFRESH_TOKEN_STORE: str = "postgres"  # postgres | redis
+    REFRESH_TOKEN_REUSE_GRACE_SECONDS: int = 30  # параллельные запросы со старым refresh-токеном после ротации, 0 — выкл.
     REFRESH_PRIVATE_KEY: str
     REFRESH_PUBLIC_KEY: str
     PREVIOUS_REFRESH_PUBLIC_KEY: str
+    KEYS_RELOAD_CHECK_INTERVAL_SECONDS: int = 5
+    KEYS_PREVIOUS_TO_KEEP: int = 1  # сколько предыдущих публичных ключей сохраняется при ротации
+    JWKS_MAX_AGE_SECONDS: int = 300  # Cache-Control для /.well-known/jwks.json
+    JWT_ENGINE: str = "jose"  # jose | cryptography (собственная реализация ES256, включается явно)
+    JWT_SIGN_OFF_LOOP: bool = False  # подписывать токены в пуле потоков, а не в event loop
 
     GOOGLE_CLIENT_ID: str
     GOOGLE_CLIENT_SECRET: str
@@ -34,11 +117,17 @@ class Settings(BaseSettings):
     YANDEX_CLIENT_ID: str
     YANDEX_CLIENT_SECRET: str
 
+    PASSWORD_HASHER_EXECUTOR: str = "thread"  # thread | process
+    PASSWORD_HASHER_MAX_WORKERS: int = 4
+    PASSWORD_HASHER_MAX_QUEUE_SIZE: int = 64
+
     @property
     def DATABASE_URL(self):
         return f"postgresql+asyncpg://{self.DB_USER}:{self.DB_PASS}@{self.DB_HOST}:{self.DB_PORT}/{self.DB_NAME}"
 
-    model_config = SettingsConfigDict(env_file=(".env", ".env.keys", ".env.oauth"))
+    # extra="ignore": при KEYS_PREVIOUS_TO_KEEP > 1 ротация пишет в .env.keys PREVIOUS_*_PUBLIC_KEY_2, _3, ...
+    # Их читает только KeyManager, для Settings это лишние поля, которые иначе не дали бы процессу запуститься
+    model_config = SettingsConfigDict(env_file=(".env", ".env.keys", ".env.oauth"), extra="ignore")
 
 
 settings = Settings()
@@ -3,11 +3,19 @@ from sqlalchemy.orm import DeclarativeBase
 
 
 from app.config import settings
+from app.metrics import instrument_pool
 
 DB_URL = settings.DATABASE_URL
-DATABASE_PARAMS = {}
+# Соединение занимается на время запроса (см. UnitOfWork), поэтому пул может быть небольшим
+DATABASE_PARAMS = {
+    "pool_size": settings.DB_POOL_SIZE,
+    "max_overflow": settings.DB_MAX_OVERFLOW,
+    "pool_timeout": settings.DB_POOL_TIMEOUT,
+    "pool_pre_ping": True,
+}
 
 engine = create_async_engine(DB_URL, **DATABASE_PARAMS)
+instrument_pool(engine)
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 
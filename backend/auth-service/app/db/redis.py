@@ -0,0 +1,67 @@
+import time
+from typing import Optional
+
+import redis.asyncio as redis
+from redis.asyncio.client import Pipeline
+
+from app.config import settings
+from app.metrics import REDIS_COMMAND_DURATION
+from app.tracing import record_span
+
+redis_pool: Optional[redis.BlockingConnectionPool] = None
+
+
+def get_redis_pool() -> redis.BlockingConnectionPool:
+    """Возвращает общий на процесс пул соединений Redis.
+    Создаётся в lifespan приложения, а в отдельных скриптах — при первом обращении."""
+    global redis_pool
+    if redis_pool is None:
+        redis_pool = redis.BlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            decode_responses=True,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT,
+        )
+    return redis_pool
+
+
+class InstrumentedPipeline(Pipeline):
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            duration = time.perf_counter() - started
+            REDIS_COMMAND_DURATION.labels("PIPELINE").observe(duration)
+            record_span("redis", duration)
+
+
+class InstrumentedRedis(redis.Redis):
+    """Клиент Redis, замеряющий время каждой команды (pipeline — целиком, как одна команда PIPELINE)"""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            duration = time.perf_counter() - started
+            REDIS_COMMAND_DURATION.labels(str(args[0]).upper()).observe(duration)
+            record_span("redis", duration)
+
+    def pipeline(self, transaction: bool = True, shard_hint: Optional[str] = None) -> InstrumentedPipeline:
+        return InstrumentedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+def get_redis_client() -> redis.Redis:
+    """Клиент поверх общего пула: создание дешёвое, новых соединений не открывает"""
+    return InstrumentedRedis(connection_pool=get_redis_pool())
+
+
+async def close_redis_pool() -> None:
+    global redis_pool
+    if redis_pool is not None:
+        await redis_pool.aclose()
+        redis_pool = None
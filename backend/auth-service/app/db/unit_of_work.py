@@ -0,0 +1,53 @@
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.db.db import async_session_maker
+from app.repositories.emailOutboxRepo import EmailOutboxRepository
+from app.repositories.redisTokensRepo import RedisTokensRepository
+from app.repositories.repository import AFTER_COMMIT_CALLBACKS
+from app.repositories.tokensRepo import AbstractTokensRepository, TokensRepository
+from app.repositories.usersRepo import UsersRepository
+
+
+class UnitOfWork:
+    """Одна сессия и одна транзакция на запрос для всех репозиториев.
+    Коммит выполняется один раз при выходе из контекста; release() позволяет вернуть соединение в пул раньше,
+    например перед долгой проверкой пароля."""
+
+    def __init__(self, session_factory: async_sessionmaker = async_session_maker):
+        self.session_factory = session_factory
+        self.session: Optional[AsyncSession] = None
+
+    async def __aenter__(self) -> "UnitOfWork":
+        self.session = self.session_factory()
+        self.users = UsersRepository(self.session)
+        self.tokens: AbstractTokensRepository = (RedisTokensRepository()
+                                                 if settings.REFRESH_TOKEN_STORE == "redis"
+                                                 else TokensRepository(self.session))
+        self.email_outbox = EmailOutboxRepository(self.session)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                await self.rollback()
+        finally:
+            await self.session.close()
+
+    async def commit(self) -> None:
+        """Фиксирует транзакцию, отдаёт соединение в пул и выполняет отложенные до коммита действия"""
+        await self.session.commit()
+        for callback in self.session.info.pop(AFTER_COMMIT_CALLBACKS, []):
+            await callback()
+
+    async def rollback(self) -> None:
+        self.session.info.pop(AFTER_COMMIT_CALLBACKS, None)
+        await self.session.rollback()
+
+    async def release(self) -> None:
+        """Завершает текущую транзакцию и возвращает соединение в пул до следующего запроса к БД"""
+        await self.commit()
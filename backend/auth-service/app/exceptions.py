@@ -7,9 +7,10 @@ class CustomException(HTTPException):
     status_code = 500
     detail = ""
 
-    def __init__(self, detail: Optional[str] = None):
+    def __init__(self, detail: Optional[str] = None, headers: Optional[dict[str, str]] = None):
         super().__init__(status_code=self.status_code,
-                         detail=detail if detail is not None else self.detail)
+                         detail=detail if detail is not None else self.detail,
+                         headers=headers)
 
 
 class UserNotVerified(CustomException):
@@ -26,6 +27,11 @@ class UserNotExist(CustomException):
     status_code = status.HTTP_404_NOT_FOUND
 
 
+class ProfileNotFound(CustomException):
+    status_code = status.HTTP_404_NOT_FOUND
+    detail = "Profile not found or expired"
+
+
 class RegistrationFailed(CustomException):
     status_code = status.HTTP_400_BAD_REQUEST
     detail = "Registration failed"
@@ -48,6 +54,10 @@ class TokenExpired(TokenInvalid):
     detail = "Token is expired"
 
 
+class TokenRevoked(TokenInvalid):
+    detail = "Token has been revoked"
+
+
 class RefreshTokenInvalid(TokenInvalid):
     detail = "Refresh token is invalid or expired"
 
@@ -72,6 +82,10 @@ class ForbiddenAccess(CustomException):
     detail = "Access to this resource is forbidden"
 
 
+class IntrospectionDisabled(ForbiddenAccess):
+    detail = "Token introspection is disabled: INTROSPECTION_SECRET is not configured"
+
+
 class InternalServerError(CustomException):
     status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
     detail = "An internal server error occurred"
@@ -94,3 +108,20 @@ class NotFoundEmailOAuth(InvalidEmail):
 class EmailIsTaken(CustomException):
     status_code = status.HTTP_409_CONFLICT
     detail = "Email is already taken"
+
+
+class ServiceOverloaded(CustomException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = "Service is overloaded. Try again later"
+
+
+class TooManyRequests(CustomException):
+    status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    detail = "Too many requests. Try again later"
+
+    def __init__(self, retry_after: int, detail: Optional[str] = None):
+        super().__init__(detail=detail, headers={"Retry-After": str(max(1, retry_after))})
+
+
+class LoginLocked(TooManyRequests):
+    detail = "Too many failed login attempts. Try again later"
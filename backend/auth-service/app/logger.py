@@ -1,9 +1,39 @@
-import logging
+import atexit
+import copy
 import json
+import logging
+import queue
+import random
 import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import NamedTuple, Optional
 
 from app.config import settings
 
+try:
+    import orjson
+except ImportError:  # без orjson остаётся стандартный json
+    orjson = None
+
+
+class RequestContext(NamedTuple):
+    """Контекст текущего HTTP-запроса. scope — ASGI scope запроса: маршрут появляется в нём после роутинга"""
+    request_id: str
+    scope: dict
+
+    @property
+    def route(self) -> Optional[str]:
+        route = self.scope.get("route")
+        return getattr(route, "path", None)
+
+
+request_context: ContextVar[Optional[RequestContext]] = ContextVar("request_context", default=None)
+
+# Необязательные поля записи, которые попадают в JSON, если выставлены
+EXTRA_FIELDS = ("suppressed", "dropped", "sample_rate", "duration_ms", "spans")
+
 
 class JsonFormatter(logging.Formatter):
     def format(self, record):
@@ -12,15 +42,122 @@ class JsonFormatter(logging.Formatter):
             "level": record.levelname,
             "name": record.name,
             "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "route": getattr(record, "route", None),
         }
-        return json.dumps(log_record)
+        for field in EXTRA_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                log_record[field] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            log_record["exc_info"] = record.exc_text
+        if orjson is not None:
+            return orjson.dumps(log_record, default=str).decode("utf-8")
+        return json.dumps(log_record, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    """Добавляет в запись request_id и шаблон маршрута текущего запроса.
+    Работает в потоке, который пишет лог, пока контекст запроса ещё доступен"""
+
+    def filter(self, record):
+        context = request_context.get()
+        record.request_id = context.request_id if context else None
+        record.route = context.route if context else None
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Выборка и ограничение частоты по ключу сообщения — логгер, уровень и шаблон msg (без подставленных аргументов).
+    sample_rates: {шаблон: доля} для сообщений ниже WARNING; rate_limit: не больше сообщений с одним ключом за окно,
+    число отброшенных выводится в поле suppressed первого сообщения следующего окна"""
+    MAX_KEYS = 10000
+
+    def __init__(self, rate_limit: int, window_seconds: float, sample_rates: dict[str, float]):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.window_seconds = window_seconds
+        self.sample_rates = sample_rates
+        self._windows: dict[tuple, list] = {}  # ключ -> [начало окна, сообщений, отброшено]
+
+    def filter(self, record):
+        template = record.msg if isinstance(record.msg, str) else repr(type(record.msg))
+        sample_rate = self.sample_rates.get(template)
+        if sample_rate is not None and record.levelno < logging.WARNING:
+            if random.random() >= sample_rate:
+                return False
+            record.sample_rate = sample_rate
+
+        if self.rate_limit <= 0:
+            return True
+        key = (record.name, record.levelno, template)
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.window_seconds:
+            if window is not None and window[2]:
+                record.suppressed = window[2]
+            if window is None and len(self._windows) >= self.MAX_KEYS:
+                self._windows.clear()
+            window = self._windows[key] = [now, 0, 0]
+        if window[1] >= self.rate_limit:
+            window[2] += 1
+            return False
+        window[1] += 1
+        return True
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Кладёт запись в ограниченную очередь без ожидания: при переполнении запись отбрасывается,
+    а количество потерянных записей выводится в поле dropped следующей записи"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Аргументы и трассировка форматируются сразу: объекты могут измениться, пока запись ждёт в очереди.
+        # Сериализация в JSON и запись в stdout выполняются потоком QueueListener
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if self.dropped:
+            record.dropped, self.dropped = self.dropped, 0
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BlockingStopQueueListener(QueueListener):
+    def enqueue_sentinel(self):
+        # При остановке очередь может быть полной: ждём места, чтобы поток записи завершился
+        self.queue.put(self._sentinel)
 
 
 # Создаём логгер
 logger = logging.getLogger("app")
 logger.setLevel(getattr(logging, settings.LOG_LEVEL, logging.INFO))
 
-# Обработчик логов (в консоль)
+# Обработчик логов (в консоль) работает в отдельном потоке: event loop только кладёт запись в очередь
 console_handler = logging.StreamHandler(sys.stdout)
 console_handler.setFormatter(JsonFormatter())
-logger.addHandler(console_handler)
+
+log_queue: queue.Queue = queue.Queue(maxsize=settings.LOG_QUEUE_SIZE)
+queue_handler = DroppingQueueHandler(log_queue)
+queue_handler.addFilter(SamplingFilter(rate_limit=settings.LOG_RATE_LIMIT_PER_KEY,
+                                       window_seconds=settings.LOG_RATE_LIMIT_WINDOW_SECONDS,
+                                       sample_rates=settings.LOG_SAMPLE_RATES))
+queue_handler.addFilter(RequestContextFilter())
+logger.addHandler(queue_handler)
+
+log_listener = BlockingStopQueueListener(log_queue, console_handler)
+log_listener.start()
+atexit.register(log_listener.stop)
@@ -1,20 +1,61 @@
+import asyncio
+from contextlib import asynccontextmanager, suppress
+
 import uvicorn
 from fastapi import FastAPI, Request
 from starlette.middleware.sessions import SessionMiddleware
 from starlette.responses import JSONResponse
 
 from app.api.auth_router import auth_router as auth_router
+from app.api.metrics_router import metrics_router
 from app.api.oauth_router import oauth_router as oauth_router
+from app.api.well_known_router import well_known_router
+from app.config import settings
+from app.db.redis import get_redis_pool, close_redis_pool
 from app.logger import logger
+from app.metrics import mark_process_dead
 from app.middlewares.exception_middleware import ExceptionMiddleware
+from app.middlewares.metrics import MetricsMiddleware
+from app.middlewares.request_context import RequestContextMiddleware
+from app.middlewares.tracing import TracingMiddleware
+from app.repositories.tokensDenylist import access_tokens_denylist
+from app.repositories.usersCache import users_cache
+from app.services.email_delivery import email_dispatcher
+from app.utils.key_manager import key_manager
+from app.utils.password_hasher import password_hasher
+from app.workers.maintenance import run_scheduler
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    key_manager.reload()
+    get_redis_pool()
+    password_hasher.start()
+    email_dispatcher.start()
+    users_cache_listener = asyncio.create_task(users_cache.listen_invalidations())
+    denylist_listener = asyncio.create_task(access_tokens_denylist.listen_revocations())
+    maintenance_stop = asyncio.Event()
+    maintenance = asyncio.create_task(run_scheduler(maintenance_stop)) if settings.MAINTENANCE_ENABLED else None
+    yield
+    maintenance_stop.set()
+    for task in (users_cache_listener, denylist_listener, maintenance):
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    await email_dispatcher.stop(timeout=settings.EMAIL_SHUTDOWN_TIMEOUT_SECONDS)
+    password_hasher.shutdown()
+    await close_redis_pool()
+    mark_process_dead()
+
 
-app = FastAPI(title="Auth")
+app = FastAPI(title="Auth", lifespan=lifespan)
 
 
 # Обработчик для всех необработанных исключений
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
-    logger.error(f"Unhandled exception: {exc}", exc_info=True)
+    logger.error("Unhandled exception: %s", exc, exc_info=True)
     return JSONResponse(
         status_code=500,
         content={"detail": "Internal Server Error"},
@@ -23,7 +64,15 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 app.include_router(auth_router)
 app.add_middleware(SessionMiddleware, secret_key="adsasdasasd")
+if settings.TRACING_ENABLED:
+    # Внутри RequestContextMiddleware: лог медленного запроса получает request_id
+    app.add_middleware(TracingMiddleware)
+app.add_middleware(RequestContextMiddleware)
 app.include_router(oauth_router)
+app.include_router(well_known_router)
+if settings.METRICS_ENABLED:
+    app.include_router(metrics_router)
+    app.add_middleware(MetricsMiddleware)
 # заменил ExceptionMiddleware на general_exception_handler (логированием занимается FastAPI)
 """app.add_middleware(ExceptionMiddleware)"""
 
@@ -0,0 +1,126 @@
+"""Метрики Prometheus для горячих путей сервиса, отдаются на GET /metrics.
+
+При нескольких воркерах uvicorn/gunicorn значения хранятся в mmap-файлах каталога PROMETHEUS_MULTIPROC_DIR
+(multiprocess-режим prometheus_client), и /metrics любого воркера собирает сумму по всем процессам.
+Каталог очищается перед запуском воркеров (см. Dockerfile). Без переменной метрики живут в памяти процесса."""
+import inspect
+import os
+import time
+from functools import wraps
+from typing import Callable
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.tracing import record_span
+
+MULTIPROCESS_DIR = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+if MULTIPROCESS_DIR:
+    # Отдельные процессы (воркер outbox, maintenance) могут стартовать раньше, чем каталог создан
+    os.makedirs(MULTIPROCESS_DIR, exist_ok=True)
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge,  # noqa: E402
+                               Histogram, generate_latest, multiprocess)
+
+# Границы для быстрых операций в памяти (JWT, Redis) и для bcrypt
+FAST_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+BCRYPT_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1, 1.5, 2.5, 5, 10)
+
+HTTP_REQUEST_DURATION = Histogram("auth_http_request_duration_seconds", "HTTP request latency",
+                                  ["method", "route", "status"])
+
+PASSWORD_HASH_DURATION = Histogram("auth_password_hash_duration_seconds",
+                                   "bcrypt hash/verify duration including the wait for a free worker",
+                                   ["operation"], buckets=BCRYPT_BUCKETS)
+PASSWORD_HASHER_QUEUE_DEPTH = Gauge("auth_password_hasher_queue_depth",
+                                    "bcrypt tasks running or waiting for a worker", multiprocess_mode="livesum")
+
+JWT_DURATION = Histogram("auth_jwt_duration_seconds", "JWT sign/verify duration", ["operation"],
+                         buckets=FAST_BUCKETS)
+
+DB_POOL_CHECKED_OUT = Gauge("auth_db_pool_checked_out", "Database connections checked out of the pool",
+                            multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("auth_db_pool_overflow", "Database connections opened above pool_size",
+                         multiprocess_mode="livesum")
+REPOSITORY_DURATION = Histogram("auth_repository_method_duration_seconds", "Repository method latency",
+                                ["repository", "method"], buckets=FAST_BUCKETS + (0.5, 1, 2.5))
+
+REDIS_COMMAND_DURATION = Histogram("auth_redis_command_duration_seconds", "Redis command latency", ["command"],
+                                   buckets=FAST_BUCKETS)
+
+SMTP_SEND_DURATION = Histogram("auth_smtp_send_duration_seconds", "SMTP send latency",
+                               buckets=(0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30))
+SMTP_SEND_FAILURES = Counter("auth_smtp_send_failures_total", "Failed SMTP sends")
+
+RATE_LIMIT_REJECTIONS = Counter("auth_rate_limit_rejections_total", "Requests rejected by the rate limiter",
+                                ["route"])
+LOGIN_LOCKOUTS = Counter("auth_login_lockouts_total", "Login attempts rejected by the login throttle")
+MAINTENANCE_ROWS_REMOVED = Counter("auth_maintenance_rows_removed_total", "Rows removed by maintenance jobs",
+                                   ["job"])
+
+
+def generate_metrics() -> tuple[bytes, str]:
+    """Тело ответа /metrics и его Content-Type"""
+    if MULTIPROCESS_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    """Убирает live-gauge завершающегося воркера из общей суммы"""
+    if MULTIPROCESS_DIR:
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def instrument_pool(engine: AsyncEngine) -> None:
+    """Gauge занятых соединений и overflow по событиям пула SQLAlchemy"""
+    pool = engine.sync_engine.pool
+
+    def update_overflow() -> None:
+        overflow = getattr(pool, "overflow", None)
+        if overflow is not None:
+            DB_POOL_OVERFLOW.set(max(0, overflow()))
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(*args):
+        DB_POOL_CHECKED_OUT.inc()
+        update_overflow()
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(*args):
+        DB_POOL_CHECKED_OUT.dec()
+        update_overflow()
+
+
+def timed_repository_method(repository: str, method: str, func: Callable) -> Callable:
+    histogram = REPOSITORY_DURATION.labels(repository, method)
+    span_name = f"{repository}.{method}"
+
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            duration = time.perf_counter() - started
+            histogram.observe(duration)
+            record_span(span_name, duration)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_repository(cls: type) -> None:
+    """Оборачивает публичные async-методы класса репозитория (в том числе унаследованные) замером времени.
+    Метка repository — имя конкретного класса"""
+    for name in dir(cls):
+        if name.startswith("_"):
+            continue
+        func = inspect.getattr_static(cls, name)
+        if not inspect.iscoroutinefunction(func):
+            continue
+        # Унаследованный метод уже обёрнут для родителя: замер переносится на исходную функцию
+        func = func.__wrapped__ if getattr(func, "__instrumented__", False) else func
+        setattr(cls, name, timed_repository_method(cls.__name__, name, func))
@@ -12,7 +12,7 @@ class ExceptionMiddleware(BaseHTTPMiddleware):
             response = await call_next(request)
             return response
         except CustomException as http_exc:
-            logger.warning(f"HTTPException: {http_exc.detail}")
+            logger.warning("HTTPException: %s", http_exc.detail)
             return JSONResponse(status_code=http_exc.status_code, content={"detail": http_exc.detail})
         except Exception as exc:
             # Логируем полную трассировку ошибки в консоль
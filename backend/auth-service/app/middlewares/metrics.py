@@ -0,0 +1,37 @@
+import time
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.metrics import HTTP_REQUEST_DURATION
+
+# Метка для запросов, не совпавших ни с одним маршрутом: сырые пути не должны раздувать число серий
+UNMATCHED_ROUTE = "unmatched"
+
+
+class MetricsMiddleware:
+    """ASGI-middleware: время обработки запроса по методу, шаблону маршрута и коду ответа"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # Шаблон маршрута (/auth/{provider}/...) известен только после роутинга
+            route = getattr(scope.get("route"), "path", UNMATCHED_ROUTE)
+            HTTP_REQUEST_DURATION.labels(scope["method"], route, str(status_code)).observe(
+                time.perf_counter() - started)
@@ -0,0 +1,42 @@
+import re
+import uuid
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.logger import RequestContext, request_context
+
+REQUEST_ID_HEADER = b"x-request-id"
+# Входящий X-Request-ID принимается только в безопасном виде, иначе генерируется свой
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class RequestContextMiddleware:
+    """ASGI-middleware: выставляет контекст запроса для логов (request_id, маршрут) и возвращает X-Request-ID.
+    Без BaseHTTPMiddleware, чтобы не добавлять на каждый запрос отдельную задачу и буферизацию ответа"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")
+                break
+        if not request_id or not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (REQUEST_ID_HEADER, request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_context.set(RequestContext(request_id, scope))
+        await self.app(scope, receive, send_with_request_id)
+        # При исключении контекст не сбрасывается: его увидит лог обработчика ошибок снаружи middleware.
+        # Каждый запрос выполняется в своей задаче, поэтому в другие запросы контекст не попадает
+        request_context.reset(token)
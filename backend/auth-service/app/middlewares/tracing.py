@@ -0,0 +1,59 @@
+import uuid
+
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.config import settings
+from app.logger import logger
+from app.services.request_profiles import request_profiles
+from app.tracing import Trace, current_trace
+
+PROFILE_HEADER = "x-profile"
+
+
+class TracingMiddleware:
+    """ASGI-middleware: собирает спаны запроса в Trace, отдаёт их в Server-Timing и пишет в лог медленные запросы.
+    Запрос администратора с заголовком X-Profile дополнительно профилируется;
+    id профиля возвращается в X-Profile-Id, сам профиль — GET /auth/profiles/{id}"""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profiler = None
+        profile_id = None
+        request = Request(scope)
+        if request.headers.get(PROFILE_HEADER):
+            profiler = await request_profiles.start(request.cookies.get("access_token"))
+            if profiler is not None:
+                profile_id = uuid.uuid4().hex
+
+        trace = Trace()
+        token = current_trace.set(trace)
+
+        async def send_with_timing(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                # Server-Timing раскрывает этапы обработки, поэтому по умолчанию отдаётся только профилируемым запросам
+                if settings.SERVER_TIMING_ENABLED or profiler is not None:
+                    headers.append((b"server-timing", trace.server_timing().encode("latin-1")))
+                if profile_id is not None:
+                    headers.append((b"x-profile-id", profile_id.encode("latin-1")))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_trace.reset(token)
+            if profiler is not None:
+                await request_profiles.finish(profile_id, profiler)
+            duration_ms = trace.elapsed() * 1000
+            if duration_ms >= settings.TRACING_SLOW_REQUEST_MS:
+                route = getattr(scope.get("route"), "path", scope["path"])
+                logger.warning("Slow request %s %s: %.1f ms", scope["method"], route, duration_ms,
+                               extra={"duration_ms": round(duration_ms, 2), "spans": trace.summary()})
@@ -12,6 +12,7 @@ from app.models.users import User
 from app.models.roles import Role
 from app.models.refresh_tokens import RefreshToken
 from app.models.oauth_accounts import OAuthAccount
+from app.models.email_outbox import EmailOutbox
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
@@ -0,0 +1,34 @@
+"""added token_hash to refresh_tokens
+
+Revision ID: 8d2e6b4c1a90
+Revises: 3f9a1c2d7b8e
+Create Date: 2026-10-18 15:02:47.118204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e6b4c1a90'
+down_revision: Union[str, None] = '3f9a1c2d7b8e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('refresh_tokens', sa.Column('token_hash', sa.CHAR(length=64), nullable=True))
+    # Заполняем дайджест для уже выданных токенов
+    op.execute("UPDATE refresh_tokens SET token_hash = encode(sha256(convert_to(token, 'UTF8')), 'hex')")
+    op.alter_column('refresh_tokens', 'token_hash', nullable=False)
+    op.create_unique_constraint('refresh_tokens_token_hash_key', 'refresh_tokens', ['token_hash'])
+    # Уникальный индекс по полному JWT больше не нужен
+    op.drop_constraint('refresh_tokens_token_key', 'refresh_tokens', type_='unique')
+
+
+def downgrade() -> None:
+    op.create_unique_constraint('refresh_tokens_token_key', 'refresh_tokens', ['token'])
+    op.drop_constraint('refresh_tokens_token_hash_key', 'refresh_tokens', type_='unique')
+    op.drop_column('refresh_tokens', 'token_hash')
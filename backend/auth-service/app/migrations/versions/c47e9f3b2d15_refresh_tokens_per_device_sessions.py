@@ -0,0 +1,41 @@
+"""refresh_tokens per device sessions
+
+Revision ID: c47e9f3b2d15
+Revises: 8d2e6b4c1a90
+Create Date: 2026-10-18 15:41:09.523871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e9f3b2d15'
+down_revision: Union[str, None] = '8d2e6b4c1a90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Одна строка на сессию устройства: у пользователя может быть несколько refresh-токенов
+    op.drop_constraint('refresh_tokens_user_id_key', 'refresh_tokens', type_='unique')
+    op.add_column('refresh_tokens', sa.Column('user_agent', sa.String(length=255), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('last_used_at', sa.DateTime(), nullable=True))
+    op.execute("UPDATE refresh_tokens SET last_used_at = created_at")
+    op.alter_column('refresh_tokens', 'last_used_at', nullable=False)
+    op.create_index('ix_refresh_tokens_user_id_expires_at', 'refresh_tokens', ['user_id', 'expires_at'], unique=False)
+    # Сам JWT больше не хранится, поиск только по token_hash
+    op.drop_column('refresh_tokens', 'token')
+
+
+def downgrade() -> None:
+    op.add_column('refresh_tokens', sa.Column('token', sa.String(), nullable=True))
+    op.drop_index('ix_refresh_tokens_user_id_expires_at', table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'last_used_at')
+    op.drop_column('refresh_tokens', 'user_agent')
+    # Токены без исходного JWT восстановить нельзя: сессии завершаются, пользователи входят заново
+    op.execute("DELETE FROM refresh_tokens")
+    op.alter_column('refresh_tokens', 'token', nullable=False)
+    op.create_unique_constraint('refresh_tokens_user_id_key', 'refresh_tokens', ['user_id'])
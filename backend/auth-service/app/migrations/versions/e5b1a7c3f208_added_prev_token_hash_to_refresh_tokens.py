@@ -0,0 +1,30 @@
+"""added prev_token_hash to refresh_tokens
+
+Revision ID: e5b1a7c3f208
+Revises: c47e9f3b2d15
+Create Date: 2026-10-18 16:10:32.508117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e5b1a7c3f208'
+down_revision: Union[str, None] = 'c47e9f3b2d15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('refresh_tokens', sa.Column('prev_token_hash', sa.CHAR(length=64), nullable=True))
+    op.add_column('refresh_tokens', sa.Column('rotated_at', sa.DateTime(), nullable=True))
+    op.create_index('ix_refresh_tokens_prev_token_hash', 'refresh_tokens', ['prev_token_hash'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_refresh_tokens_prev_token_hash', table_name='refresh_tokens')
+    op.drop_column('refresh_tokens', 'rotated_at')
+    op.drop_column('refresh_tokens', 'prev_token_hash')
@@ -0,0 +1,28 @@
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import Index
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.db import Base
+
+
+class EmailOutbox(Base):
+    """Письма, записанные в одной транзакции с изменением пользователя.
+    Отправляются отдельным воркером (app.workers.email_outbox_worker)."""
+    __tablename__ = "email_outbox"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    recipient: Mapped[str] = mapped_column(nullable=False)
+    subject: Mapped[str] = mapped_column(nullable=False)
+    body: Mapped[str] = mapped_column(nullable=False)
+    attempts: Mapped[int] = mapped_column(default=0, nullable=False)
+    last_error: Mapped[Optional[str]] = mapped_column(nullable=True)
+    # До этого момента письмо не берётся в работу: задержка перед повтором или аренда воркером
+    available_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    sent_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+
+    __table_args__ = (
+        Index("ix_email_outbox_pending", "available_at", postgresql_where=sent_at.is_(None)),
+    )
@@ -1,27 +1,42 @@
 from datetime import datetime, timezone
+from typing import Optional
 
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, CHAR, String, Index
 from sqlalchemy.orm import Mapped, mapped_column
 
 from app.db.db import Base
 from app.schemas import RefreshTokenSchema
 
+USER_AGENT_MAX_LENGTH = 255
+
 
 class RefreshToken(Base):
+    """Сессия пользователя на одном устройстве. Refresh-токен меняется при каждом использовании"""
     __tablename__ = "refresh_tokens"
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id_expires_at", "user_id", "expires_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False, unique=True)
-    token: Mapped[str] = mapped_column(nullable=False, unique=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # sha256 от jti токена, по нему идёт поиск
+    token_hash: Mapped[str] = mapped_column(CHAR(64), nullable=False, unique=True)
+    # Предыдущий токен сессии: принимается ещё REFRESH_TOKEN_REUSE_GRACE_SECONDS после ротации
+    prev_token_hash: Mapped[Optional[str]] = mapped_column(CHAR(64), nullable=True, index=True)
+    rotated_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+    user_agent: Mapped[Optional[str]] = mapped_column(String(USER_AGENT_MAX_LENGTH), nullable=True)
     created_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
+    last_used_at: Mapped[datetime] = mapped_column(default=lambda: datetime.now(timezone.utc).replace(tzinfo=None))
     expires_at: Mapped[datetime] = mapped_column(nullable=False)
 
     # user: Mapped["User"] = relationship(back_populates="refresh_tokens")
 
     def to_read_model(self) -> RefreshTokenSchema:
         return RefreshTokenSchema(
+            id=self.id,
             user_id=self.user_id,
-            token=self.token,
+            user_agent=self.user_agent,
             created_at=self.created_at,
+            last_used_at=self.last_used_at,
             expires_at=self.expires_at
         )
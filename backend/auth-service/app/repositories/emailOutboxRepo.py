@@ -0,0 +1,56 @@
+from datetime import datetime, timezone, timedelta
+from typing import Sequence
+
+from sqlalchemy import select, update, insert
+
+from app.models.email_outbox import EmailOutbox
+from app.repositories.repository import SQLAlchemyRepository
+
+
+class EmailOutboxRepository(SQLAlchemyRepository):
+    model = EmailOutbox
+
+    async def add_messages(self, messages: Sequence[dict]) -> None:
+        """Добавляет письма в outbox в текущей транзакции"""
+        if messages:
+            await self.session.execute(insert(EmailOutbox), list(messages))
+
+    async def claim_batch(self, batch_size: int, lease_seconds: int, max_attempts: int) -> list[EmailOutbox]:
+        """Забирает пачку готовых к отправке писем.
+        FOR UPDATE SKIP LOCKED позволяет нескольким воркерам работать параллельно, не блокируя друг друга,
+        а сдвиг available_at на время аренды не даёт другим воркерам взять те же письма до её окончания."""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        claimable_ids = (select(EmailOutbox.id).
+                         where(EmailOutbox.sent_at.is_(None),
+                               EmailOutbox.available_at <= now,
+                               EmailOutbox.attempts < max_attempts).
+                         order_by(EmailOutbox.id).
+                         limit(batch_size).
+                         with_for_update(skip_locked=True))
+        stmt = (update(EmailOutbox).
+                where(EmailOutbox.id.in_(claimable_ids.scalar_subquery())).
+                values(attempts=EmailOutbox.attempts + 1,
+                       available_at=now + timedelta(seconds=lease_seconds)).
+                returning(EmailOutbox).
+                execution_options(synchronize_session=False))
+        result = await self.session.scalars(stmt)
+        return list(result.all())
+
+    async def mark_sent(self, message_ids: list[int]) -> None:
+        if not message_ids:
+            return
+        stmt = (update(EmailOutbox).
+                where(EmailOutbox.id.in_(message_ids)).
+                values(sent_at=datetime.now(timezone.utc).replace(tzinfo=None), last_error=None))
+        await self.session.execute(stmt)
+
+    async def mark_failed(self, message_id: int, error: str, retry_at: datetime) -> None:
+        stmt = (update(EmailOutbox).
+                where(EmailOutbox.id == message_id).
+                values(last_error=error, available_at=retry_at))
+        await self.session.execute(stmt)
+
+    async def delete_sent(self, sent_before: datetime, batch_size: int) -> int:
+        """Удаляет пачку писем, отправленных раньше sent_before. Возвращает количество удалённых строк"""
+        result = await self.delete_batch(EmailOutbox.sent_at < sent_before, batch_size=batch_size)
+        return result.rowcount
@@ -1,12 +1,14 @@
-import redis.asyncio as redis
-from typing import Optional
+from typing import AsyncIterator, Optional
 
-from app.config import settings
+from redis.asyncio.client import Pipeline, PubSub
+from redis.commands.core import AsyncScript
+
+from app.db.redis import get_redis_client
 
 
 class RedisRepository:
     def __init__(self):
-        self.redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.redis_client = get_redis_client()
 
     async def set_value(self, key: str, value: str, ttl: int) -> None:
         """Сохраняет значение в Redis с указанным TTL."""
@@ -16,6 +18,65 @@ class RedisRepository:
         """Получает значение по ключу из Redis."""
         return await self.redis_client.get(key)
 
+    async def exists(self, key: str) -> bool:
+        """Проверяет наличие ключа в Redis."""
+        return bool(await self.redis_client.exists(key))
+
+    async def scan_keys(self, pattern: str, count: int = 1000) -> AsyncIterator[str]:
+        """Перебирает ключи по шаблону через SCAN, не блокируя Redis как KEYS."""
+        async for key in self.redis_client.scan_iter(match=pattern, count=count):
+            yield key
+
+    async def get_and_delete(self, key: str) -> Optional[str]:
+        """Атомарно получает значение и удаляет ключ (GETDEL)."""
+        return await self.redis_client.getdel(key)
+
+    async def get_set_members(self, key: str) -> set[str]:
+        """Возвращает все элементы множества."""
+        return await self.redis_client.smembers(key)
+
+    async def remove_from_set(self, key: str, *values: str) -> None:
+        """Удаляет элементы из множества."""
+        await self.redis_client.srem(key, *values)
+
+    async def set_values(self, mapping: dict[str, str], ttl: Optional[int] = None) -> None:
+        """Сохраняет несколько значений за один запрос к Redis (MSET или pipeline с TTL)."""
+        if not mapping:
+            return
+        if ttl is None:
+            await self.redis_client.mset(mapping)
+            return
+        async with self.pipeline() as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def get_values(self, keys: list[str]) -> list[Optional[str]]:
+        """Получает значения нескольких ключей одной командой MGET."""
+        if not keys:
+            return []
+        return await self.redis_client.mget(keys)
+
     async def delete_key(self, key: str) -> None:
         """Удаляет ключ из Redis."""
         await self.redis_client.delete(key)
+
+    async def delete_keys(self, *keys: str) -> None:
+        """Удаляет несколько ключей из Redis одной командой."""
+        await self.redis_client.delete(*keys)
+
+    async def publish(self, channel: str, message: str) -> None:
+        """Публикует сообщение в канал Redis pub/sub."""
+        await self.redis_client.publish(channel, message)
+
+    def pipeline(self, transaction: bool = True) -> Pipeline:
+        """Возвращает pipeline для отправки нескольких команд за один round trip."""
+        return self.redis_client.pipeline(transaction=transaction)
+
+    def pubsub(self) -> PubSub:
+        """Возвращает объект подписки на каналы Redis."""
+        return self.redis_client.pubsub()
+
+    def register_script(self, script: str) -> AsyncScript:
+        """Возвращает Lua-скрипт, вызываемый через EVALSHA (с загрузкой в Redis при первом вызове)."""
+        return self.redis_client.register_script(script)
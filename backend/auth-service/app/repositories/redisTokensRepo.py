@@ -0,0 +1,133 @@
+import json
+from datetime import datetime, timezone
+from typing import Optional
+
+from app.config import settings
+from app.models.refresh_tokens import RefreshToken
+from app.repositories.redisRepository import RedisRepository
+from app.repositories.tokensRepo import AbstractTokensRepository
+from app.utils.crypto import get_token_digest
+
+
+class RedisTokensRepository(AbstractTokensRepository):
+    """Сессии в Redis. Истечение срока действия — штатный TTL ключей.
+    refresh_token:{sha256 jti} -> данные сессии, refresh_token:user:{user_id} -> множество sha256 сессий пользователя,
+    refresh_token:rotated:{sha256 старого jti} -> sha256 нового jti на время REFRESH_TOKEN_REUSE_GRACE_SECONDS"""
+    TOKEN_KEY_PREFIX = "refresh_token:"
+    USER_KEY_PREFIX = "refresh_token:user:"
+    ROTATED_KEY_PREFIX = "refresh_token:rotated:"
+
+    def __init__(self):
+        self.redis_repository = RedisRepository()
+
+    @classmethod
+    def _token_key(cls, token_hash: str) -> str:
+        return f"{cls.TOKEN_KEY_PREFIX}{token_hash}"
+
+    @classmethod
+    def _user_key(cls, user_id: int) -> str:
+        return f"{cls.USER_KEY_PREFIX}{user_id}"
+
+    @classmethod
+    def _rotated_key(cls, token_hash: str) -> str:
+        return f"{cls.ROTATED_KEY_PREFIX}{token_hash}"
+
+    @staticmethod
+    def _expire_at(expires_at: datetime) -> int:
+        """Время истечения в unix-секундах (expires_at хранится в UTC без tzinfo)"""
+        return int(expires_at.replace(tzinfo=timezone.utc).timestamp())
+
+    @staticmethod
+    def _serialize(refresh_token: RefreshToken) -> str:
+        return json.dumps({"user_id": refresh_token.user_id,
+                           "user_agent": refresh_token.user_agent,
+                           "created_at": refresh_token.created_at.isoformat(),
+                           "last_used_at": refresh_token.last_used_at.isoformat(),
+                           "expires_at": refresh_token.expires_at.isoformat()})
+
+    @staticmethod
+    def _deserialize(token_hash: str, value: Optional[str]) -> RefreshToken | None:
+        if value is None:
+            return None
+        data = json.loads(value)
+        return RefreshToken(user_id=data["user_id"],
+                            token_hash=token_hash,
+                            user_agent=data["user_agent"],
+                            created_at=datetime.fromisoformat(data["created_at"]),
+                            last_used_at=datetime.fromisoformat(data["last_used_at"]),
+                            expires_at=datetime.fromisoformat(data["expires_at"]))
+
+    async def _save(self, refresh_token: RefreshToken, replaced_hash: Optional[str] = None) -> None:
+        """Записывает сессию и добавляет её в множество пользователя.
+        Новый токен всегда истекает позже остальных, поэтому TTL множества сдвигается на его срок"""
+        expire_at = self._expire_at(refresh_token.expires_at)
+        user_key = self._user_key(refresh_token.user_id)
+        async with self.redis_repository.pipeline() as pipe:
+            pipe.set(self._token_key(refresh_token.token_hash), self._serialize(refresh_token), exat=expire_at)
+            if replaced_hash:
+                pipe.srem(user_key, replaced_hash)
+                if settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS > 0:
+                    pipe.set(self._rotated_key(replaced_hash), refresh_token.token_hash,
+                             ex=settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS)
+            pipe.sadd(user_key, refresh_token.token_hash)
+            pipe.expireat(user_key, expire_at)
+            await pipe.execute()
+
+    async def create_session(self, user_id: int, token_id: str, expires_at: datetime,
+                             user_agent: Optional[str] = None) -> RefreshToken:
+        """Создаёт новую сессию. Сессии на других устройствах не затрагиваются"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        refresh_token = RefreshToken(user_id=user_id, token_hash=get_token_digest(token_id), user_agent=user_agent,
+                                     created_at=now, last_used_at=now, expires_at=expires_at)
+        await self._save(refresh_token)
+        return refresh_token
+
+    async def rotate_refresh_token(self, user_id: int, old_token_id: str, new_token_id: str,
+                                   expires_at: datetime) -> bool:
+        """Заменяет refresh-токен сессии новым.
+        GETDEL атомарно забирает старую запись, поэтому один токен не может быть использован дважды"""
+        old_hash = get_token_digest(old_token_id)
+        refresh_token = self._deserialize(old_hash, await self.redis_repository.get_and_delete(self._token_key(old_hash)))
+        if refresh_token is None or refresh_token.user_id != user_id:
+            return False
+
+        refresh_token.token_hash = get_token_digest(new_token_id)
+        refresh_token.last_used_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        refresh_token.expires_at = expires_at
+        await self._save(refresh_token, replaced_hash=old_hash)
+        return True
+
+    async def is_recently_rotated(self, user_id: int, old_token_id: str, grace_seconds: int) -> bool:
+        """Был ли токен недавно заменён (ключ живёт grace_seconds) и жива ли сессия с новым токеном"""
+        new_hash = await self.redis_repository.get_value(self._rotated_key(get_token_digest(old_token_id)))
+        if new_hash is None:
+            return False
+        refresh_token = self._deserialize(new_hash, await self.redis_repository.get_value(self._token_key(new_hash)))
+        return refresh_token is not None and refresh_token.user_id == user_id
+
+    async def get_refresh_token(self, token_id: str) -> RefreshToken | None:
+        token_hash = get_token_digest(token_id)
+        return self._deserialize(token_hash, await self.redis_repository.get_value(self._token_key(token_hash)))
+
+    async def delete_refresh_token(self, token_id: str) -> None:
+        token_hash = get_token_digest(token_id)
+        refresh_token = self._deserialize(token_hash,
+                                          await self.redis_repository.get_and_delete(self._token_key(token_hash)))
+        if refresh_token is not None:
+            await self.redis_repository.remove_from_set(self._user_key(refresh_token.user_id), token_hash)
+
+    async def delete_user_sessions(self, user_id: int) -> int:
+        """Завершает все сессии пользователя. Возвращает количество удалённых сессий"""
+        user_key = self._user_key(user_id)
+        token_hashes = await self.redis_repository.get_set_members(user_key)
+        if not token_hashes:
+            return 0
+        async with self.redis_repository.pipeline() as pipe:
+            pipe.delete(*(self._token_key(token_hash) for token_hash in token_hashes))
+            pipe.delete(user_key)
+            deleted, _ = await pipe.execute()
+        return deleted
+
+    async def delete_expired_sessions(self, batch_size: int) -> int:
+        """Истёкшие сессии Redis удаляет сам по TTL"""
+        return 0
@@ -1,8 +1,20 @@
 from abc import ABC, abstractmethod
+from typing import Awaitable, Callable
 
-from sqlalchemy import insert, select, update
+from sqlalchemy import delete, insert, literal_column, select, update
+from sqlalchemy.engine import Result
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.db import async_session_maker
+from app.metrics import instrument_repository
+
+UNIQUE_VIOLATION = "23505"
+AFTER_COMMIT_CALLBACKS = "after_commit_callbacks"
+
+
+def is_unique_violation(exc: IntegrityError) -> bool:
+    """Проверяет, что ошибка вызвана нарушением уникального индекса"""
+    return getattr(exc.orig, "sqlstate", None) == UNIQUE_VIOLATION
 
 
 class AbstractRepository(ABC):
@@ -16,37 +28,54 @@ class AbstractRepository(ABC):
 
 
 class SQLAlchemyRepository(AbstractRepository):
+    """Репозиторий работает в сессии UnitOfWork: коммитом и соединением управляет она, а не отдельные методы"""
     model = None
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Время каждого запроса к БД попадает в метрики с именем репозитория и метода
+        instrument_repository(cls)
+
+    def __init__(self, session: AsyncSession):
+        self.session = session
+
+    def after_commit(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """Регистрирует действие, которое UnitOfWork выполнит после успешного коммита (например, сброс кэша)"""
+        self.session.info.setdefault(AFTER_COMMIT_CALLBACKS, []).append(callback)
+
     async def add_one(self, data: dict) -> int:
         """Добавление записи"""
-        async with async_session_maker() as session:
-            stmt = insert(self.model).values(**data).returning(self.model.id)
-            result = await session.execute(stmt)
-            await session.commit()
-            return result.scalar_one()
+        stmt = insert(self.model).values(**data).returning(self.model.id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one()
 
     async def find_by_id(self, record_id: int):
         """Получение записи по id"""
-        async with async_session_maker() as session:
-            stmt = select(self.model).where(self.model.id == record_id)
-            result = await session.execute(stmt)
-            return result.scalar_one_or_none()
+        stmt = select(self.model).where(self.model.id == record_id)
+        result = await self.session.execute(stmt)
+        return result.scalar_one_or_none()
 
     async def find_all(self):
         """Получение всех записей"""
-        async with async_session_maker() as session:
-            stmt = select(self.model)
-            result = await session.execute(stmt)
-            result = [row[0].to_read_model() for row in result.scalars()]
-            return result
+        stmt = select(self.model)
+        result = await self.session.execute(stmt)
+        result = [row[0].to_read_model() for row in result.scalars()]
+        return result
 
     async def update(self, record_id: int, data: dict) -> bool:
         """Обновление записи"""
-        async with async_session_maker() as session:
-            stmt = (update(self.model).
-                    where(self.model.id == record_id).
-                    values(**data))
-            result = await session.execute(stmt)
-            await session.commit()
+        stmt = (update(self.model).
+                where(self.model.id == record_id).
+                values(**data))
+        result = await self.session.execute(stmt)
         return result.rowcount  # кол-во измененных строк в бд == True/False
+
+    async def delete_batch(self, *conditions, batch_size: int, returning=None) -> Result:
+        """Удаляет не больше batch_size подходящих строк: DELETE ... WHERE ctid IN (SELECT ctid ... LIMIT n).
+        Короткие пачки не держат долгих блокировок и не раздувают WAL одной большой транзакцией"""
+        ctid = literal_column("ctid")
+        batch = select(ctid).select_from(self.model).where(*conditions).limit(batch_size)
+        stmt = delete(self.model).where(ctid.in_(batch.scalar_subquery()))
+        if returning is not None:
+            stmt = stmt.returning(returning)
+        return await self.session.execute(stmt)
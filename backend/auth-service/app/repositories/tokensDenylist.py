@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import Optional
+
+from app.config import settings
+from app.logger import logger
+from app.repositories.redisRepository import RedisRepository
+from app.utils.bloom_filter import BloomFilter
+
+
+class TokensDenylist:
+    """Отозванные access-токены по jti.
+    Источник истины — ключи revoked:jti:{jti} в Redis с TTL до exp токена. Каждая реплика держит локальный
+    Bloom-фильтр, синхронизированный через pub/sub, поэтому неотозванный токен проверяется без обращения к Redis."""
+    KEY_PREFIX = "revoked:jti:"
+    CHANNEL = "tokens:revoked"
+
+    def __init__(self, enabled: bool, capacity: int, error_rate: float, rebuild_interval: int):
+        self.enabled = enabled
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._filter = BloomFilter(capacity, error_rate)
+        self._ready = False  # фильтр заполнен из Redis и получает обновления
+        self._rebuild_at = 0.0
+
+    @property
+    def redis_repository(self) -> RedisRepository:
+        return RedisRepository()
+
+    @classmethod
+    def _key(cls, jti: str) -> str:
+        return f"{cls.KEY_PREFIX}{jti}"
+
+    async def revoke(self, jti: Optional[str], exp: int) -> None:
+        """Отзывает токен до момента его истечения exp (unix-время)"""
+        ttl = int(exp - time.time())
+        if not self.enabled or not jti or ttl <= 0:
+            return
+        await self.redis_repository.set_value(self._key(jti), "1", ttl=ttl)
+        self._filter.add(jti)
+        await self.redis_repository.publish(self.CHANNEL, jti)
+
+    async def is_revoked(self, jti: Optional[str]) -> bool:
+        """Проверяет, отозван ли токен. Redis запрашивается только при попадании в фильтр
+        (или пока фильтр ещё не синхронизирован)"""
+        if not self.enabled or not jti:
+            return False
+        if self._ready and jti not in self._filter:
+            return False
+        try:
+            return await self.redis_repository.exists(self._key(jti))
+        except Exception as exc:
+            logger.warning("Tokens denylist is unavailable: %s", exc)
+            # Попадание в синхронизированный фильтр — скорее всего токен действительно отозван
+            return self._ready
+
+    async def _rebuild(self) -> None:
+        """Собирает фильтр заново по ключам Redis: истёкшие jti из него уходят"""
+        bloom_filter = BloomFilter(self.capacity, self.error_rate)
+        async for key in self.redis_repository.scan_keys(f"{self.KEY_PREFIX}*"):
+            bloom_filter.add(key[len(self.KEY_PREFIX):])
+        if len(bloom_filter) > self.capacity:
+            logger.warning("Tokens denylist holds %s tokens, more than filter capacity %s",
+                           len(bloom_filter), self.capacity)
+        self._filter = bloom_filter
+        self._ready = True
+        self._rebuild_at = time.monotonic() + self.rebuild_interval
+
+    async def listen_revocations(self) -> None:
+        """Фоновая задача: добавляет в фильтр токены, отозванные на других репликах.
+        Подписка оформляется до сборки фильтра, поэтому отзывы во время SCAN не теряются"""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                async with self.redis_repository.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    await self._rebuild()
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is not None and message["type"] == "message":
+                            self._filter.add(message["data"])
+                        if time.monotonic() >= self._rebuild_at:
+                            await self._rebuild()
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Пока подписка не работала, могли пропустить отзывы: до пересборки проверяем через Redis
+                logger.warning("Tokens denylist listener failed: %s", exc)
+                self._ready = False
+                await asyncio.sleep(1)
+
+
+access_tokens_denylist = TokensDenylist(enabled=settings.ACCESS_TOKEN_REVOCATION_ENABLED,
+                                        capacity=settings.REVOCATION_FILTER_CAPACITY,
+                                        error_rate=settings.REVOCATION_FILTER_ERROR_RATE,
+                                        rebuild_interval=settings.REVOCATION_FILTER_REBUILD_INTERVAL_SECONDS)
@@ -1,61 +1,108 @@
-from datetime import datetime, timezone
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
-from sqlalchemy import select, delete, update
-from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy import select, delete, insert, update
 
-from app.db.db import async_session_maker
 from app.models.refresh_tokens import RefreshToken
 from app.repositories.repository import SQLAlchemyRepository
+from app.utils.crypto import get_token_digest
 
 
-class TokensRepository(SQLAlchemyRepository):
+class AbstractTokensRepository(ABC):
+    """Хранилище сессий с refresh-токенами. Реализация выбирается настройкой REFRESH_TOKEN_STORE.
+    Сессия ищется по sha256 от jti токена: jti известен до подписи, поэтому ротацию можно выполнить раньше неё"""
+
+    @abstractmethod
+    async def create_session(self, user_id: int, token_id: str, expires_at: datetime,
+                             user_agent: Optional[str] = None) -> RefreshToken:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rotate_refresh_token(self, user_id: int, old_token_id: str, new_token_id: str,
+                                   expires_at: datetime) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def is_recently_rotated(self, user_id: int, old_token_id: str, grace_seconds: int) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_refresh_token(self, token_id: str) -> RefreshToken | None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_refresh_token(self, token_id: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_user_sessions(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_expired_sessions(self, batch_size: int) -> int:
+        raise NotImplementedError
+
+
+class TokensRepository(SQLAlchemyRepository, AbstractTokensRepository):
+    """Сессии в таблице refresh_tokens Postgres: одна строка на устройство"""
     model = RefreshToken
 
-    async def save_refresh_token(self, user_id: int, token: str, expires_at: datetime) -> RefreshToken:
-        """Сохраняет RefreshToken в базе данных.
-        Если токен уже существует для пользователя, он перезаписывается."""
-        async with async_session_maker() as session:
-            async with session.begin():
-                query = insert(RefreshToken).values(
-                    user_id=user_id, token=token, expires_at=expires_at
-                ).on_conflict_do_update(  # Если у пользователя уже есть токен, заменяем его новым
-                    index_elements=[RefreshToken.user_id],
-                    set_={
-                        "token": token,
-                        "expires_at": expires_at,
-                        "created_at": datetime.now(timezone.utc).replace(tzinfo=None)
-                    }
-                ).returning(RefreshToken)
-                result = await session.execute(query)
-                await session.commit()
-                return result.scalar_one()
-
-    async def get_refresh_token(self, token: str) -> RefreshToken | None:
-        async with async_session_maker() as session:
-            query = select(RefreshToken).where(RefreshToken.token == token)
-            result = await session.scalar(query)
-            if result:
-                return result
-
-    async def get_refresh_token_by_user_id(self, user_id: int) -> RefreshToken | None:
-        async with async_session_maker() as session:
-            query = select(RefreshToken).where(RefreshToken.user_id == user_id)
-            result = await session.scalar(query)
-            if result:
-                return result
-
-    async def is_refresh_token_valid(self, token: str) -> bool:
-        """Проверяет, является ли refresh-токен действительным (существует и не истек)"""
-        async with async_session_maker() as session:
-            query = select(RefreshToken).where(
-                RefreshToken.token == token,
-                RefreshToken.expires_at > datetime.now(timezone.utc).replace(tzinfo=None)
-            )
-            result = await session.scalar(query)
-            return result is not None
-
-    async def delete_refresh_token(self, token: str) -> None:
-        async with async_session_maker() as session:
-            query = delete(RefreshToken).where(RefreshToken.token == token)
-            await session.execute(query)
-            await session.commit()
+    async def create_session(self, user_id: int, token_id: str, expires_at: datetime,
+                             user_agent: Optional[str] = None) -> RefreshToken:
+        """Создаёт новую сессию. Сессии на других устройствах не затрагиваются"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        query = insert(RefreshToken).values(
+            user_id=user_id, token_hash=get_token_digest(token_id), user_agent=user_agent,
+            created_at=now, last_used_at=now, expires_at=expires_at
+        ).returning(RefreshToken)
+        result = await self.session.execute(query)
+        return result.scalar_one()
+
+    async def rotate_refresh_token(self, user_id: int, old_token_id: str, new_token_id: str,
+                                   expires_at: datetime) -> bool:
+        """Заменяет refresh-токен сессии новым одним UPDATE.
+        Возвращает False, если старый токен не найден, истёк или уже был использован"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        old_hash = get_token_digest(old_token_id)
+        query = (update(RefreshToken)
+                 .where(RefreshToken.token_hash == old_hash,
+                        RefreshToken.user_id == user_id,
+                        RefreshToken.expires_at > now)
+                 .values(token_hash=get_token_digest(new_token_id), prev_token_hash=old_hash, rotated_at=now,
+                         expires_at=expires_at, last_used_at=now)
+                 .returning(RefreshToken.id))
+        result = await self.session.execute(query)
+        return result.scalar_one_or_none() is not None
+
+    async def is_recently_rotated(self, user_id: int, old_token_id: str, grace_seconds: int) -> bool:
+        """Был ли токен заменён параллельным запросом не раньше grace_seconds назад (сессия при этом жива)"""
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        query = (select(RefreshToken.id)
+                 .where(RefreshToken.prev_token_hash == get_token_digest(old_token_id),
+                        RefreshToken.user_id == user_id,
+                        RefreshToken.rotated_at > now - timedelta(seconds=grace_seconds),
+                        RefreshToken.expires_at > now))
+        return await self.session.scalar(query) is not None
+
+    async def get_refresh_token(self, token_id: str) -> RefreshToken | None:
+        query = select(RefreshToken).where(RefreshToken.token_hash == get_token_digest(token_id))
+        result = await self.session.scalar(query)
+        if result:
+            return result
+
+    async def delete_refresh_token(self, token_id: str) -> None:
+        query = delete(RefreshToken).where(RefreshToken.token_hash == get_token_digest(token_id))
+        await self.session.execute(query)
+
+    async def delete_user_sessions(self, user_id: int) -> int:
+        """Завершает все сессии пользователя одним DELETE. Возвращает количество удалённых сессий"""
+        query = delete(RefreshToken).where(RefreshToken.user_id == user_id)
+        result = await self.session.execute(query)
+        return result.rowcount
+
+    async def delete_expired_sessions(self, batch_size: int) -> int:
+        """Удаляет пачку истёкших сессий. Возвращает количество удалённых строк"""
+        result = await self.delete_batch(RefreshToken.expires_at <= datetime.now(timezone.utc).replace(tzinfo=None),
+                                         batch_size=batch_size)
+        return result.rowcount
@@ -0,0 +1,215 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Iterable, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.models.users import User
+from app.repositories.redisRepository import RedisRepository
+
+# Запись в кэш только для пользователей без надгробия (tombstone): после инвалидации
+# строка, прочитанная из БД до коммита изменения, не должна вернуться в кэш.
+# KEYS: пары (ключ пользователя, ключ надгробия); ARGV: ttl, затем данные пользователей по порядку.
+SET_IF_NOT_INVALIDATED_SCRIPT = """
+local ttl = tonumber(ARGV[1])
+for i = 1, #KEYS, 2 do
+    if redis.call('EXISTS', KEYS[i + 1]) == 0 then
+        redis.call('SET', KEYS[i], ARGV[(i + 1) / 2 + 1], 'EX', ttl)
+    end
+end
+return 0
+"""
+
+
+class UsersCache:
+    """Двухуровневый кэш пользователей по id: локальный TTL-словарь процесса + Redis.
+    Инвалидация рассылается остальным репликам через Redis pub/sub.
+
+    Запись после чтения из БД (set/set_many) может опоздать за инвалидацией: читатель получил строку до коммита
+    изменения, а записывает её в кэш уже после. Поэтому инвалидация оставляет надгробие — в Redis ключ
+    с TTL tombstone_ttl, локально время инвалидации, — и записи, прочитанные до него, в кэш не попадают."""
+    KEY_PREFIX = "user:"
+    TOMBSTONE_PREFIX = "user:invalidated:"
+    CHANNEL = "users:invalidate"
+    # Хеш пароля и соль в кэш не попадают
+    FIELDS = ("id", "email", "fullname", "is_verified", "role_id", "created_at")
+
+    def __init__(self, enabled: bool, local_ttl: int, redis_ttl: int, local_max_size: int, tombstone_ttl: int):
+        self.enabled = enabled
+        self.local_ttl = local_ttl
+        self.redis_ttl = redis_ttl
+        self.local_max_size = local_max_size
+        self.tombstone_ttl = tombstone_ttl
+        self._local: OrderedDict[int, tuple[float, dict]] = OrderedDict()
+        self._invalidated_at: OrderedDict[int, float] = OrderedDict()  # id -> monotonic-время последней инвалидации
+
+    @property
+    def redis_repository(self) -> RedisRepository:
+        return RedisRepository()
+
+    @classmethod
+    def _serialize(cls, user: User) -> dict:
+        data = {field: getattr(user, field) for field in cls.FIELDS}
+        data["created_at"] = data["created_at"].isoformat() if data["created_at"] else None
+        return data
+
+    @staticmethod
+    def _deserialize(data: dict) -> User:
+        data = dict(data)
+        data["created_at"] = datetime.fromisoformat(data["created_at"]) if data["created_at"] else None
+        return User(**data)
+
+    @staticmethod
+    def read_started() -> float:
+        """Отметка перед чтением из БД; передаётся в set/set_many"""
+        return time.monotonic()
+
+    def _mark_invalidated(self, user_id: int) -> None:
+        self._local.pop(user_id, None)
+        self._invalidated_at[user_id] = time.monotonic()
+        self._invalidated_at.move_to_end(user_id)
+        if len(self._invalidated_at) > self.local_max_size:
+            self._invalidated_at.popitem(last=False)
+
+    def _invalidated_since(self, user_id: int, read_at: float) -> bool:
+        invalidated_at = self._invalidated_at.get(user_id)
+        return invalidated_at is not None and invalidated_at >= read_at
+
+    async def _set_if_not_invalidated(self, users_data: list[tuple[int, dict]]) -> None:
+        keys = []
+        args = [self.redis_ttl]
+        for user_id, data in users_data:
+            keys += [f"{self.KEY_PREFIX}{user_id}", f"{self.TOMBSTONE_PREFIX}{user_id}"]
+            args.append(json.dumps(data))
+        try:
+            set_if_not_invalidated = self.redis_repository.register_script(SET_IF_NOT_INVALIDATED_SCRIPT)
+            await set_if_not_invalidated(keys=keys, args=args)
+        except Exception as exc:
+            logger.warning("Users cache is unavailable: %s", exc)
+
+    def _set_local(self, user_id: int, data: dict) -> None:
+        self._local[user_id] = (time.monotonic() + self.local_ttl, data)
+        self._local.move_to_end(user_id)
+        if len(self._local) > self.local_max_size:
+            self._local.popitem(last=False)
+
+    async def get(self, user_id: int) -> Optional[User]:
+        if not self.enabled:
+            return None
+
+        entry = self._local.get(user_id)
+        if entry is not None:
+            expires_at, data = entry
+            if expires_at > time.monotonic():
+                return self._deserialize(data)
+            self._local.pop(user_id, None)
+
+        try:
+            raw_data = await self.redis_repository.get_value(f"{self.KEY_PREFIX}{user_id}")
+        except Exception as exc:
+            logger.warning("Users cache is unavailable: %s", exc)
+            return None
+        if raw_data is None:
+            return None
+        data = json.loads(raw_data)
+        self._set_local(user_id, data)
+        return self._deserialize(data)
+
+    async def get_many(self, user_ids: Iterable[int]) -> dict[int, User]:
+        """Пакетный get: сначала локальный уровень, остальные пользователи — одним MGET из Redis"""
+        if not self.enabled:
+            return {}
+
+        users = {}
+        missing = []
+        now = time.monotonic()
+        for user_id in user_ids:
+            entry = self._local.get(user_id)
+            if entry is not None and entry[0] > now:
+                users[user_id] = self._deserialize(entry[1])
+            else:
+                missing.append(user_id)
+        if not missing:
+            return users
+
+        try:
+            raw_values = await self.redis_repository.get_values([f"{self.KEY_PREFIX}{user_id}" for user_id in missing])
+        except Exception as exc:
+            logger.warning("Users cache is unavailable: %s", exc)
+            return users
+        for user_id, raw_data in zip(missing, raw_values):
+            if raw_data is None:
+                continue
+            data = json.loads(raw_data)
+            self._set_local(user_id, data)
+            users[user_id] = self._deserialize(data)
+        return users
+
+    async def set_many(self, users: Iterable[User], read_at: float) -> None:
+        """Пакетный set пользователей, прочитанных из БД начиная с read_at: в Redis — одним скриптом.
+        Пользователи, инвалидированные после read_at, пропускаются"""
+        if not self.enabled:
+            return
+        users_data = []
+        for user in users:
+            if self._invalidated_since(user.id, read_at):
+                continue
+            data = self._serialize(user)
+            self._set_local(user.id, data)
+            users_data.append((user.id, data))
+        if users_data:
+            await self._set_if_not_invalidated(users_data)
+
+    async def set(self, user: User, read_at: float) -> None:
+        await self.set_many([user], read_at)
+
+    async def invalidate(self, user_ids: Iterable[int]) -> None:
+        """Удаляет пользователей из обоих уровней кэша и оповещает остальные реплики"""
+        user_ids = list(user_ids)
+        if not self.enabled or not user_ids:
+            return
+        for user_id in user_ids:
+            self._mark_invalidated(user_id)
+        try:
+            async with self.redis_repository.pipeline() as pipe:
+                for user_id in user_ids:
+                    pipe.set(f"{self.TOMBSTONE_PREFIX}{user_id}", 1, ex=self.tombstone_ttl)
+                pipe.delete(*(f"{self.KEY_PREFIX}{user_id}" for user_id in user_ids))
+                pipe.publish(self.CHANNEL, ",".join(map(str, user_ids)))
+                await pipe.execute()
+        except Exception as exc:
+            logger.error("Failed to invalidate users cache for %s: %s", user_ids, exc)
+
+    async def listen_invalidations(self) -> None:
+        """Фоновая задача: убирает из локального кэша пользователей, изменённых на других репликах"""
+        if not self.enabled:
+            return
+        while True:
+            try:
+                async with self.redis_repository.pubsub() as pubsub:
+                    await pubsub.subscribe(self.CHANNEL)
+                    # get_message с таймаутом, а не listen(): соединения пула читают с socket_timeout,
+                    # и listen() на тихом канале падал бы по таймауту, сбрасывая локальный кэш
+                    while True:
+                        message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                        if message is None or message["type"] != "message":
+                            continue
+                        for user_id in message["data"].split(","):
+                            self._mark_invalidated(int(user_id))
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                # Пока подписка не работала, могли пропустить инвалидации
+                logger.warning("Users cache invalidation listener failed: %s", exc)
+                self._local.clear()
+                await asyncio.sleep(1)
+
+
+users_cache = UsersCache(enabled=settings.USER_CACHE_ENABLED,
+                         local_ttl=settings.USER_CACHE_LOCAL_TTL_SECONDS,
+                         redis_ttl=settings.USER_CACHE_REDIS_TTL_SECONDS,
+                         local_max_size=settings.USER_CACHE_LOCAL_MAX_SIZE,
+                         tombstone_ttl=settings.USER_CACHE_TOMBSTONE_SECONDS)
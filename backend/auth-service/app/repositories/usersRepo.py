@@ -1,70 +1,136 @@
-from sqlalchemy import select, insert, update
+from datetime import datetime
+from typing import Iterable
 
-from app.db.db import async_session_maker
+from sqlalchemy import ARRAY, Integer, any_, bindparam, select, insert, update, exists
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.exc import IntegrityError
+
+from app.exceptions import EmailIsTaken
 from app.models.oauth_accounts import OAuthAccount
+from app.models.refresh_tokens import RefreshToken
 from app.models.users import User
-from app.repositories.repository import SQLAlchemyRepository
+from app.repositories.repository import SQLAlchemyRepository, is_unique_violation
+from app.repositories.usersCache import users_cache
 
 
 class UsersRepository(SQLAlchemyRepository):
     model = User
 
-    async def create_user(self, data: dict) -> User:
-        """Добавление пользователя"""
-        async with async_session_maker() as session:
-            stmt = insert(User).values(**data).returning(User.__table__.columns)
-            result = await session.execute(stmt)
-            await session.commit()
-            return result.fetchone()
+    async def create_user(self, data: dict) -> User | None:
+        """Добавление пользователя одним INSERT ... ON CONFLICT DO NOTHING.
+        Возвращает None, если email уже занят"""
+        stmt = (pg_insert(User).values(**data).
+                on_conflict_do_nothing(index_elements=[User.email]).
+                returning(User.__table__.columns))
+        result = await self.session.execute(stmt)
+        return result.fetchone()
 
 
 # может быть переделать !!!!!!!!!!!!
     async def create_oauth_user(self, email: str, fullname: str, provider: str, provider_id: str) -> User:
         user_data = {"email": email, "fullname": fullname, "is_verified": True}
-        async with async_session_maker() as session:
-            async with session.begin():
-                # Вставляем пользователя и сразу получаем его id
-                stmt_user = insert(User).values(**user_data).returning(User.__table__.columns)
-                result = await session.execute(stmt_user)
-                user_row = result.fetchone()
+        # Вставляем пользователя и сразу получаем его id
+        stmt_user = insert(User).values(**user_data).returning(User.__table__.columns)
+        result = await self.session.execute(stmt_user)
+        user_row = result.fetchone()
+
+        if not user_row:
+            raise ValueError("Ошибка создания пользователя")
+
+        # Создаем запись OAuth-аккаунта
+        stmt_oauth = insert(OAuthAccount).values(user_id=user_row.id, provider=provider,
+                                                 provider_id=provider_id)
+        await self.session.execute(stmt_oauth)
+
+        return User(id=user_row.id, email=user_row.email, fullname=user_row.fullname,
+                    is_verified=user_row.is_verified)
 
-                if not user_row:
-                    raise ValueError("Ошибка создания пользователя")
+    async def find_by_id(self, record_id: int) -> User | None:
+        """Получение пользователя по id через двухуровневый кэш"""
+        user = await users_cache.get(record_id)
+        if user:
+            return user
+        read_at = users_cache.read_started()
+        user = await super().find_by_id(record_id)
+        if user:
+            await users_cache.set(user, read_at)
+        return user
 
-                # Создаем запись OAuth-аккаунта
-                stmt_oauth = insert(OAuthAccount).values(user_id=user_row.id, provider=provider,
-                                                         provider_id=provider_id)
-                await session.execute(stmt_oauth)
+    async def find_by_ids(self, user_ids: Iterable[int]) -> dict[int, User]:
+        """Пакетное получение пользователей {id: пользователь}: кэш, затем один запрос WHERE id = ANY(:ids).
+        Массив передаётся одним параметром, поэтому текст запроса не зависит от размера пачки"""
+        user_ids = list(dict.fromkeys(user_ids))
+        users = await users_cache.get_many(user_ids)
+        missing = [user_id for user_id in user_ids if user_id not in users]
+        if not missing:
+            return users
 
-            await session.commit()
-            return User(id=user_row.id, email=user_row.email, fullname=user_row.fullname,
-                        is_verified=user_row.is_verified)
+        stmt = select(User).where(User.id == any_(bindparam("user_ids", missing, type_=ARRAY(Integer))))
+        read_at = users_cache.read_started()
+        found = (await self.session.scalars(stmt)).all()
+        await users_cache.set_many(found, read_at)
+        users.update((user.id, user) for user in found)
+        return users
+
+    async def email_exists(self, email: str) -> bool:
+        """Проверка занятости email без загрузки строки"""
+        return bool(await self.session.scalar(select(exists().where(User.email == email))))
 
     async def find_by_email(self, email: str) -> User | None:
         """Получение записи по email"""
-        async with async_session_maker() as session:
-            stmt = select(User).where(User.email == email)
-            result = await session.scalar(stmt)
-            if result:
-                return result
+        stmt = select(User).where(User.email == email)
+        result = await self.session.scalar(stmt)
+        if result:
+            return result
+
+    def _invalidate_cache_after_commit(self, user_ids: list[int]) -> None:
+        if user_ids:
+            self.after_commit(lambda: users_cache.invalidate(user_ids))
 
     async def update_password(self, email: str, hashed_password: str, salt: str) -> bool:
-        async with async_session_maker() as session:
-            stmt = update(User).where(User.email == email).values(hashed_password=hashed_password, salt=salt)
-            result = await session.execute(stmt)
-            await session.commit()
-            return result.rowcount > 0
+        stmt = (update(User).where(User.email == email).
+                values(hashed_password=hashed_password, salt=salt).
+                returning(User.id))
+        result = await self.session.execute(stmt)
+        user_ids = result.scalars().all()
+        self._invalidate_cache_after_commit(user_ids)
+        return len(user_ids) > 0
 
     async def update_email(self, old_email: str, new_email: str) -> bool:
-        async with async_session_maker() as session:
-            stmt = update(User).where(User.email == old_email).values(email=new_email)
-            result = await session.execute(stmt)
-            await session.commit()
-            return result.rowcount > 0
+        """Меняет email и сбрасывает верификацию одним UPDATE.
+        Занятость нового email проверяет уникальный индекс: нарушение превращается в EmailIsTaken"""
+        stmt = (update(User).where(User.email == old_email).
+                values(email=new_email, is_verified=False).
+                returning(User.id))
+        try:
+            result = await self.session.execute(stmt)
+        except IntegrityError as exc:
+            if is_unique_violation(exc):
+                raise EmailIsTaken
+            raise
+        user_ids = result.scalars().all()
+        self._invalidate_cache_after_commit(user_ids)
+        return len(user_ids) > 0
 
     async def update_verification_status(self, email: str, status: bool) -> bool:
-        async with async_session_maker() as session:
-            stmt = update(User).where(User.email == email).values(is_verified=status)
-            result = await session.execute(stmt)
-            await session.commit()
-            return result.rowcount > 0
+        """Меняет статус верификации. Возвращает False, если пользователя нет или статус уже такой"""
+        stmt = (update(User).where(User.email == email, User.is_verified.is_not(status)).
+                values(is_verified=status).
+                returning(User.id))
+        result = await self.session.execute(stmt)
+        user_ids = result.scalars().all()
+        self._invalidate_cache_after_commit(user_ids)
+        return len(user_ids) > 0
+
+    async def delete_stale_unverified(self, created_before: datetime, batch_size: int) -> list[int]:
+        """Удаляет пачку неверифицированных пользователей, зарегистрированных раньше created_before
+        и не имеющих ни одной сессии в таблице refresh_tokens. Возвращает id удалённых пользователей"""
+        result = await self.delete_batch(User.is_verified.is_(False),
+                                         User.created_at < created_before,
+                                         ~exists().where(RefreshToken.user_id == User.id),
+                                         ~exists().where(OAuthAccount.user_id == User.id),
+                                         batch_size=batch_size,
+                                         returning=User.id)
+        user_ids = list(result.scalars().all())
+        self._invalidate_cache_after_commit(user_ids)
+        return user_ids
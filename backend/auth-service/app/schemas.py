@@ -3,6 +3,8 @@ from typing import Optional
 
 from pydantic import BaseModel, EmailStr, field_validator, ValidationInfo, Field
 
+from app.config import settings
+
 
 class MessageResponse(BaseModel):
     message: str
@@ -57,9 +59,11 @@ class UserResponseSchema(BaseModel):
 
 
 class RefreshTokenSchema(BaseModel):
+    id: Optional[int]
     user_id: int
-    token: str
+    user_agent: Optional[str]
     created_at: datetime
+    last_used_at: datetime
     expires_at: datetime
 
     class Config:
@@ -70,3 +74,23 @@ class TokensResponse(BaseModel):
     access_token: str
     refresh_token: str
     message: str
+
+
+class IntrospectRequest(BaseModel):
+    tokens: list[str] = Field(min_length=1, max_length=settings.INTROSPECTION_MAX_TOKENS,
+                              description="Access tokens to check")
+
+
+class TokenIntrospection(BaseModel):
+    active: bool
+    error: Optional[str] = Field(default=None, description="invalid, expired, revoked or user_not_found")
+    user_id: Optional[int] = None
+    jti: Optional[str] = None
+    exp: Optional[int] = None
+    email: Optional[str] = None
+    is_verified: Optional[bool] = None
+    role_id: Optional[int] = None
+
+
+class IntrospectResponse(BaseModel):
+    results: list[TokenIntrospection]
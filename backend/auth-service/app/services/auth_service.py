@@ -1,38 +1,50 @@
-from typing import Optional
+from typing import Optional, Sequence
 
-from app.exceptions import UserAlreadyExists, InvalidCredentials, EmailIsTaken, EmailVerificationFailed, \
-    UserAlreadyVerified, NotFoundEmailOAuth
+from app.exceptions import UserAlreadyExists, InvalidCredentials, EmailVerificationFailed, \
+    UserAlreadyVerified, NotFoundEmailOAuth, EmailIsTaken
+from app.db.unit_of_work import UnitOfWork
 from app.models.users import User
+from app.repositories.emailOutboxRepo import EmailOutboxRepository
 from app.repositories.usersRepo import UsersRepository
-from app.utils.helpers import generate_hashed_password, check_password
+from app.utils.password_hasher import password_hasher
 
 
 class AuthService:
 
-    def __init__(self, users_repository: UsersRepository):
-        self.users_repository: UsersRepository = users_repository
+    def __init__(self, uow: UnitOfWork):
+        self.uow = uow
+        self.users_repository: UsersRepository = uow.users
+        self.email_outbox_repository: EmailOutboxRepository = uow.email_outbox
 
-    async def register_user(self, email: str, password: str, fullname: Optional[str]) -> User | None:
-        # Проверяем, существует ли пользователь с данным email
-        user_is_exist = await self.users_repository.find_by_email(email)
-        if user_is_exist:
+    async def register_user(self, email: str, password: str, fullname: Optional[str],
+                            outbox_messages: Sequence[dict] = ()) -> User | None:
+        # Дешёвая проверка до bcrypt: повторная регистрация не должна занимать пул хеширования
+        if await self.users_repository.email_exists(email):
             raise UserAlreadyExists
+        # Возвращаем соединение в пул на время bcrypt
+        await self.uow.release()
 
-        password_info = generate_hashed_password(password)
+        password_info = await password_hasher.hash_password(password)
         user_data = {"email": email,
                      "hashed_password": password_info["hashed_password"],
                      "salt": password_info["salt"],
                      "fullname": fullname}
+        # Гонку двух регистраций с одним email закрывает INSERT ... ON CONFLICT DO NOTHING
         new_user = await self.users_repository.create_user(user_data)
+        if not new_user:
+            raise UserAlreadyExists
+        await self.email_outbox_repository.add_messages(outbox_messages)
 
         return new_user
 
     async def login_user(self, email: str, password: str) -> User | None:
         # Проверяем, существует ли пользователь с данным email
         user = await self.users_repository.find_by_email(email)
-        if not user:
+        # Возвращаем соединение в пул на время bcrypt
+        await self.uow.release()
+        if not user or not user.hashed_password:  # у OAuth-пользователей нет пароля
             return None
-        if not check_password(password, user.hashed_password, user.salt):
+        if not await password_hasher.check_password(password, user.hashed_password, user.salt):
             return None
         return user
 
@@ -66,31 +78,36 @@ class AuthService:
         return existing_user
 
     async def verify_user_by_email(self, email: str) -> bool:
+        user_is_updated = await self.users_repository.update_verification_status(email, True)
+        if user_is_updated:
+            return user_is_updated
+
+        # UPDATE ничего не изменил — выясняем причину (редкий путь)
         user = await self.users_repository.find_by_email(email)
         if not user:
             raise EmailVerificationFailed(detail="User not found. Try /send-verification-email again")
         if user.is_verified:
             raise UserAlreadyVerified
+        raise EmailVerificationFailed
 
-        user_is_updated = await self.users_repository.update_verification_status(email, True)
-        if not user_is_updated:
-            raise EmailVerificationFailed
-        return user_is_updated
-
-    async def change_password(self, email: str, current_password: str, new_password: str) -> bool:
+    async def change_password(self, email: str, current_password: str, new_password: str,
+                              outbox_messages: Sequence[dict] = ()) -> bool:
         user = await self.login_user(email, current_password)  # Check the old password
         if not user:
             raise InvalidCredentials
 
-        password_info = generate_hashed_password(new_password)
+        password_info = await password_hasher.hash_password(new_password)
         hashed_password = password_info["hashed_password"]
         salt = password_info["salt"]
-        return await self.users_repository.update_password(email, hashed_password, salt)
-
-    async def change_email(self, password: str, current_email: str, new_email: str) -> bool:
-        # Проверка не занят ли новый email другим пользователем
-        email_is_taken = await self.users_repository.find_by_email(new_email)
-        if email_is_taken:
+        password_is_updated = await self.users_repository.update_password(email, hashed_password, salt)
+        if password_is_updated:
+            await self.email_outbox_repository.add_messages(outbox_messages)
+        return password_is_updated
+
+    async def change_email(self, password: str, current_email: str, new_email: str,
+                           outbox_messages: Sequence[dict] = ()) -> bool:
+        # Дешёвая проверка до bcrypt: занятый email не должен занимать пул хеширования
+        if await self.users_repository.email_exists(new_email):
             raise EmailIsTaken
 
         # Проверка данных входа
@@ -98,6 +115,9 @@ class AuthService:
         if not user:
             raise InvalidCredentials
 
-        # Изменение email пользователя и обнуление его верификации
-        await self.users_repository.update_email(current_email, new_email)
-        return await self.users_repository.update_verification_status(new_email, False)
+        # Изменение email пользователя и обнуление его верификации одним UPDATE;
+        # гонку с регистрацией или другой сменой на тот же email закрывает уникальный индекс (EmailIsTaken)
+        email_is_updated = await self.users_repository.update_email(current_email, new_email)
+        if email_is_updated:
+            await self.email_outbox_repository.add_messages(outbox_messages)
+        return email_is_updated
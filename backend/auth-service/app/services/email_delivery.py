@@ -0,0 +1,142 @@
+import asyncio
+import time
+from email.message import EmailMessage
+from typing import Optional
+
+import aiosmtplib
+
+from app.config import settings
+from app.exceptions import ServiceOverloaded
+from app.logger import logger
+from app.metrics import SMTP_SEND_DURATION, SMTP_SEND_FAILURES
+from app.tracing import record_span
+
+
+class SMTPConnection:
+    """Переиспользуемая аутентифицированная SMTP-сессия: подключается при первой отправке
+    и держит соединение открытым между письмами."""
+
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+
+    async def _connect(self) -> aiosmtplib.SMTP:
+        smtp = aiosmtplib.SMTP(hostname=settings.SMTP_HOST,
+                               port=int(settings.SMTP_PORT),
+                               username=settings.SMTP_SENDER if settings.SMTP_PASSWORD else None,
+                               password=settings.SMTP_PASSWORD or None,
+                               use_tls=settings.SMTP_USE_TLS,
+                               timeout=settings.SMTP_TIMEOUT_SECONDS)
+        await smtp.connect()
+        self._smtp = smtp
+        return smtp
+
+    async def send(self, message: EmailMessage) -> None:
+        started = time.perf_counter()
+        try:
+            await self._send(message)
+        except Exception:
+            SMTP_SEND_FAILURES.inc()
+            raise
+        finally:
+            duration = time.perf_counter() - started
+            SMTP_SEND_DURATION.observe(duration)
+            record_span("smtp.send", duration)
+
+    async def _send(self, message: EmailMessage) -> None:
+        smtp = self._smtp
+        if smtp is None or not smtp.is_connected:
+            smtp = await self._connect()
+        try:
+            await smtp.send_message(message)
+        except aiosmtplib.SMTPServerDisconnected:
+            # Сервер мог закрыть простаивающее соединение — переподключаемся один раз
+            smtp = await self._connect()
+            await smtp.send_message(message)
+        except Exception:
+            await self.close()
+            raise
+
+    async def close(self) -> None:
+        if self._smtp is None:
+            return
+        smtp, self._smtp = self._smtp, None
+        try:
+            if smtp.is_connected:
+                await smtp.quit()
+        except aiosmtplib.SMTPException:
+            smtp.close()
+
+
+class EmailDispatcher:
+    """Очередь отправки писем внутри процесса.
+    Воркеры держат собственные SMTP-сессии, повторяют отправку с экспоненциальной задержкой
+    и дочищают очередь при остановке приложения."""
+
+    def __init__(self, workers: int, queue_size: int, max_retries: int, retry_backoff: float):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: list[asyncio.Task] = []
+
+    def start(self) -> None:
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, message: EmailMessage) -> None:
+        """Ставит письмо в очередь и сразу возвращает управление"""
+        self.start()
+        try:
+            self._queue.put_nowait(message)
+        except asyncio.QueueFull:
+            logger.error("Email queue is full, message to %s rejected", message["To"])
+            raise ServiceOverloaded
+
+    async def _worker(self) -> None:
+        connection = SMTPConnection()
+        try:
+            while True:
+                message = await self._queue.get()
+                try:
+                    await self._deliver(connection, message)
+                finally:
+                    self._queue.task_done()
+        finally:
+            await connection.close()
+
+    async def _deliver(self, connection: SMTPConnection, message: EmailMessage) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await connection.send(message)
+                logger.info("Email sent to %s with subject: %s", message["To"], message["Subject"])
+                return
+            except Exception as exc:
+                if attempt == self.max_retries:
+                    logger.error("Failed to send email to %s after %s attempts: %s",
+                                 message["To"], attempt + 1, exc)
+                    return
+                logger.warning("Failed to send email to %s (attempt %s): %s", message["To"], attempt + 1, exc)
+                await asyncio.sleep(self.retry_backoff * 2 ** attempt)
+
+    async def stop(self, timeout: float) -> None:
+        """Ждёт отправки оставшихся писем не дольше timeout секунд и останавливает воркеров"""
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.error("Email queue was not drained on shutdown, %s messages lost", self._queue.qsize())
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._queue = None
+        self._tasks = []
+
+
+email_dispatcher = EmailDispatcher(workers=settings.EMAIL_WORKERS,
+                                   queue_size=settings.EMAIL_QUEUE_MAX_SIZE,
+                                   max_retries=settings.EMAIL_MAX_RETRIES,
+                                   retry_backoff=settings.EMAIL_RETRY_BACKOFF_SECONDS)
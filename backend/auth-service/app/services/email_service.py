@@ -1,20 +1,15 @@
 from email.message import EmailMessage
 
-import aiosmtplib
-
 from app.config import settings
-from app.logger import logger
 from app.repositories.redisRepository import RedisRepository
+from app.services.email_delivery import email_dispatcher
 from app.utils.helpers import create_email_verification_token
 
 
 class EmailService:
     def __init__(self, redis_repository: RedisRepository):
         self.redis_repository = redis_repository
-        self.smtp_host = settings.SMTP_HOST
-        self.smtp_port = settings.SMTP_PORT
         self.smtp_sender = settings.SMTP_SENDER
-        self.smtp_password = settings.SMTP_PASSWORD
         self.service_host = "localhost"  # убрать в переменные окружения !!!
         self.service_port = "8000"
 
@@ -26,19 +21,16 @@ class EmailService:
         message["Subject"] = subject
         message.set_content(body)
 
-        await aiosmtplib.send(
-            message,
-            hostname=self.smtp_host,
-            port=self.smtp_port,
-            username=self.smtp_sender,
-            password=self.smtp_password,
-            use_tls=True
-        )
-        logger.info(f"Email sent to {recipient_email} with subject: {subject}")
+        # Письмо отправляется фоновыми воркерами, запрос не ждёт SMTP-сервер
+        email_dispatcher.enqueue(message)
 
-    async def send_email_verification(self, recipient_email: str) -> None:
-        verification_token = await self.generate_email_verification_token(recipient_email)
-        """Отправка письма для верификации email"""
+    @staticmethod
+    def build_message(recipient_email: str, subject: str, body: str) -> dict:
+        """Письмо в виде строки для email_outbox"""
+        return {"recipient": recipient_email, "subject": subject, "body": body}
+
+    def build_email_verification(self, recipient_email: str, verification_token: str) -> dict:
+        """Письмо для верификации email"""
         verification_link = f"http://{self.service_host}:{self.service_port}/auth/verify-email?email={recipient_email}&token={verification_token}"
         body = f"""
         Hello!
@@ -51,24 +43,33 @@ class EmailService:
         Thank you,
         Basket.log team.
         """
-        await self.send_email(recipient_email, "Email Verification", body)
+        return self.build_message(recipient_email, "Email Verification", body)
 
-    async def send_password_change_notification(self, email: str):
-        """Отправка уведомления о смене пароля"""
+    def build_password_change_notification(self, email: str) -> dict:
+        """Уведомление о смене пароля"""
         body = "Your account password has been changed. If this was not you, please contact support immediately."
-        await self.send_email(email, "Password Changed", body)
+        return self.build_message(email, "Password Changed", body)
 
-    async def send_email_change_notification(self, email: str, new_email: str):
-        """Отправка уведомления о смене email"""
+    def build_email_change_notification(self, email: str, new_email: str) -> dict:
+        """Уведомление о смене email"""
         body = f"Your account email has been changed to {new_email}. If this was not you, please contact support immediately."
-        await self.send_email(email, "Email Changed", body)
+        return self.build_message(email, "Email Changed", body)
+
+    async def send_email_verification(self, recipient_email: str) -> None:
+        """Отправка письма для верификации email"""
+        verification_token = await self.generate_email_verification_token(recipient_email)
+        message = self.build_email_verification(recipient_email, verification_token)
+        await self.send_email(message["recipient"], message["subject"], message["body"])
 
     async def generate_email_verification_token(self, email: str) -> str:
         verification_token = create_email_verification_token()
+        await self.save_email_verification_token(email, verification_token)
+        return verification_token
+
+    async def save_email_verification_token(self, email: str, verification_token: str) -> None:
         await self.redis_repository.set_value(key=email,
                                               value=verification_token,
                                               ttl=int(settings.VERIFICATION_TOKEN_EXPIRE_TIME_MINUTES) * 60)
-        return verification_token
 
     async def verify_email_verification_token(self, email: str, token: str) -> bool:
         stored_token = await self.redis_repository.get_value(email)
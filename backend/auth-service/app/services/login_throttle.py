@@ -0,0 +1,110 @@
+import math
+from typing import Optional
+
+from app.config import settings
+from app.exceptions import LoginLocked
+from app.logger import logger
+from app.metrics import LOGIN_LOCKOUTS
+from app.repositories.redisRepository import RedisRepository
+
+# Учитывает неудачный вход сразу для всех переданных счётчиков (email, IP) за один round trip.
+# KEYS: пары (счётчик неудач, ключ блокировки); ARGV: base_lockout, max_lockout, failure_window,
+# затем порог неудач для каждой пары. Блокировка растёт вдвое с каждой неудачей сверх порога.
+# Возвращает длительность самой долгой выставленной блокировки в секундах (0 — без блокировки).
+REGISTER_FAILURE_SCRIPT = """
+local base_lockout = tonumber(ARGV[1])
+local max_lockout = tonumber(ARGV[2])
+local failure_window = tonumber(ARGV[3])
+local longest = 0
+for i = 1, #KEYS, 2 do
+    local threshold = tonumber(ARGV[3 + (i + 1) / 2])
+    local failures = redis.call('INCR', KEYS[i])
+    redis.call('EXPIRE', KEYS[i], failure_window)
+    if failures >= threshold then
+        local lockout = math.floor(math.min(max_lockout, base_lockout * 2 ^ (failures - threshold)))
+        redis.call('SET', KEYS[i + 1], failures, 'EX', lockout)
+        longest = math.max(longest, lockout)
+    end
+end
+return longest
+"""
+
+
+class LoginThrottle:
+    """Защита входа от перебора паролей: счётчики неудачных попыток по email и по IP в Redis
+    с экспоненциально растущей блокировкой. Заблокированный вход отклоняется до запроса в БД и bcrypt."""
+    KEY_PREFIX = "login:"
+
+    def __init__(self, enabled: bool, email_max_failures: int, ip_max_failures: int,
+                 base_lockout: int, max_lockout: int, failure_window: int):
+        self.enabled = enabled
+        self.email_max_failures = email_max_failures
+        self.ip_max_failures = ip_max_failures
+        self.base_lockout = base_lockout
+        self.max_lockout = max_lockout
+        self.failure_window = failure_window
+
+    @property
+    def redis_repository(self) -> RedisRepository:
+        return RedisRepository()
+
+    def _keys(self, scope: str, identity: str) -> tuple[str, str]:
+        return f"{self.KEY_PREFIX}failures:{scope}:{identity}", f"{self.KEY_PREFIX}lock:{scope}:{identity}"
+
+    def _identities(self, email: str, ip: Optional[str]) -> list[tuple[str, str, int]]:
+        identities = [("email", email.strip().lower(), self.email_max_failures)]
+        if ip:
+            identities.append(("ip", ip, self.ip_max_failures))
+        return identities
+
+    async def check(self, email: str, ip: Optional[str]) -> None:
+        """Бросает LoginLocked, если вход для email или IP сейчас заблокирован"""
+        if not self.enabled:
+            return
+        try:
+            async with self.redis_repository.pipeline(transaction=False) as pipe:
+                for scope, identity, _ in self._identities(email, ip):
+                    pipe.pttl(self._keys(scope, identity)[1])
+                lock_ttls = await pipe.execute()
+        except Exception as exc:
+            logger.warning("Login throttle is unavailable: %s", exc)
+            return
+        retry_after_ms = max(lock_ttls)
+        if retry_after_ms > 0:
+            LOGIN_LOCKOUTS.inc()
+            raise LoginLocked(retry_after=math.ceil(retry_after_ms / 1000))
+
+    async def register_failure(self, email: str, ip: Optional[str]) -> None:
+        if not self.enabled:
+            return
+        keys = []
+        thresholds = []
+        for scope, identity, max_failures in self._identities(email, ip):
+            keys += self._keys(scope, identity)
+            thresholds.append(max_failures)
+        try:
+            register_failure = self.redis_repository.register_script(REGISTER_FAILURE_SCRIPT)
+            lockout = await register_failure(keys=keys, args=[self.base_lockout, self.max_lockout,
+                                                              self.failure_window, *thresholds])
+        except Exception as exc:
+            logger.warning("Login throttle is unavailable: %s", exc)
+            return
+        if lockout:
+            logger.warning("Login locked for %s seconds after repeated failures", lockout)
+
+    async def reset(self, email: str) -> None:
+        """Сбрасывает счётчик неудач аккаунта после успешного входа (счётчик IP остаётся)"""
+        if not self.enabled:
+            return
+        try:
+            await self.redis_repository.delete_keys(*self._keys("email", email.strip().lower()))
+        except Exception as exc:
+            logger.warning("Login throttle is unavailable: %s", exc)
+
+
+login_throttle = LoginThrottle(enabled=settings.LOGIN_THROTTLE_ENABLED,
+                               email_max_failures=settings.LOGIN_THROTTLE_EMAIL_MAX_FAILURES,
+                               ip_max_failures=settings.LOGIN_THROTTLE_IP_MAX_FAILURES,
+                               base_lockout=settings.LOGIN_THROTTLE_BASE_LOCKOUT_SECONDS,
+                               max_lockout=settings.LOGIN_THROTTLE_MAX_LOCKOUT_SECONDS,
+                               failure_window=settings.LOGIN_THROTTLE_FAILURE_WINDOW_SECONDS)
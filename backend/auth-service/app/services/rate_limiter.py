@@ -0,0 +1,148 @@
+import math
+import time
+import uuid
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+from app.config import settings
+from app.exceptions import TooManyRequests
+from app.logger import logger
+from app.metrics import RATE_LIMIT_REJECTIONS
+from app.repositories.redisRepository import RedisRepository
+
+# Скользящее окно на sorted set: в каждом ключе хранятся отметки времени запросов за последние window мс.
+# Сначала проверяются все ключи, и только если ни один не превышен, запрос записывается во все сразу —
+# атомарно и за один round trip.
+# KEYS: ключи окон; ARGV: now_ms, member, затем limit, window_ms для каждого ключа.
+# Возвращает 0, если запрос разрешён, иначе через сколько мс можно повторить.
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local member = ARGV[2]
+local retry_after = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[1 + i * 2])
+    local window = tonumber(ARGV[2 + i * 2])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        retry_after = math.max(retry_after, tonumber(oldest[2]) + window - now)
+    end
+end
+if retry_after > 0 then
+    return retry_after
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, tonumber(ARGV[2 + i * 2]))
+end
+return 0
+"""
+
+
+class RateLimit(NamedTuple):
+    limit: int
+    window_seconds: int
+
+
+class RateLimiter:
+    """Ограничение частоты запросов к эндпоинтам: скользящее окно в Redis по IP и по email для каждого маршрута.
+    Локальный token bucket с теми же лимитами отсекает явный перебор ещё до обращения к Redis:
+    если лимит исчерпан запросами одной этой реплики, общий лимит исчерпан тем более."""
+    KEY_PREFIX = "rate:"
+
+    def __init__(self, enabled: bool, limits: dict[str, dict[str, RateLimit]], local_max_size: int = 10000):
+        self.enabled = enabled
+        self.limits = limits
+        self.local_max_size = local_max_size
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()  # ключ -> (токены, время обновления)
+
+    @property
+    def redis_repository(self) -> RedisRepository:
+        return RedisRepository()
+
+    def _take_local_token(self, key: str, rate_limit: RateLimit) -> float:
+        """Token bucket реплики. Возвращает 0, если токен взят, иначе через сколько секунд появится следующий"""
+        now = time.monotonic()
+        refill_rate = rate_limit.limit / rate_limit.window_seconds
+        tokens, updated_at = self._buckets.get(key, (rate_limit.limit, now))
+        tokens = min(rate_limit.limit, tokens + (now - updated_at) * refill_rate)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / refill_rate
+
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        if len(self._buckets) > self.local_max_size:
+            self._buckets.popitem(last=False)
+        return 0
+
+    def _refund_local_token(self, key: str, rate_limit: RateLimit) -> None:
+        """Возвращает токен, если запрос всё-таки отклонён: отклонённые запросы не расходуют лимит реплики"""
+        bucket = self._buckets.get(key)
+        if bucket is not None:
+            tokens, updated_at = bucket
+            self._buckets[key] = (min(rate_limit.limit, tokens + 1), updated_at)
+
+    def _refund_local_tokens(self, windows: dict[str, RateLimit], taken: list[str]) -> None:
+        for key in taken:
+            self._refund_local_token(key, windows[key])
+
+    async def check(self, route: str, ip: Optional[str] = None, email: Optional[str] = None) -> None:
+        """Учитывает запрос к маршруту route. При превышении любого из лимитов бросает TooManyRequests с Retry-After"""
+        route_limits = self.limits.get(route)
+        if not self.enabled or not route_limits:
+            return
+
+        identities = {"ip": ip, "email": email.strip().lower() if email else None}
+        windows = {f"{self.KEY_PREFIX}{route}:{scope}:{identity}": route_limits[scope]
+                   for scope, identity in identities.items()
+                   if identity and scope in route_limits}
+        if not windows:
+            return
+
+        local_waits = {key: self._take_local_token(key, rate_limit) for key, rate_limit in windows.items()}
+        taken = [key for key, wait in local_waits.items() if wait == 0]
+        retry_after = max(local_waits.values())
+        if retry_after > 0:
+            self._refund_local_tokens(windows, taken)
+            RATE_LIMIT_REJECTIONS.labels(route).inc()
+            raise TooManyRequests(retry_after=math.ceil(retry_after))
+
+        args = [int(time.time() * 1000), uuid.uuid4().hex]
+        for rate_limit in windows.values():
+            args += [rate_limit.limit, rate_limit.window_seconds * 1000]
+        try:
+            sliding_window = self.redis_repository.register_script(SLIDING_WINDOW_SCRIPT)
+            retry_after_ms = await sliding_window(keys=list(windows), args=args)
+        except Exception as exc:
+            # Недоступность Redis не должна блокировать вход: остаётся только локальное ограничение
+            logger.warning("Rate limiter is unavailable: %s", exc)
+            return
+        if retry_after_ms:
+            self._refund_local_tokens(windows, taken)
+            RATE_LIMIT_REJECTIONS.labels(route).inc()
+            raise TooManyRequests(retry_after=math.ceil(int(retry_after_ms) / 1000))
+
+
+rate_limiter = RateLimiter(
+    enabled=settings.RATE_LIMIT_ENABLED,
+    limits={
+        "login": {
+            "ip": RateLimit(settings.RATE_LIMIT_LOGIN_PER_IP, settings.RATE_LIMIT_LOGIN_WINDOW_SECONDS),
+            "email": RateLimit(settings.RATE_LIMIT_LOGIN_PER_EMAIL, settings.RATE_LIMIT_LOGIN_WINDOW_SECONDS),
+        },
+        "register": {
+            "ip": RateLimit(settings.RATE_LIMIT_REGISTER_PER_IP, settings.RATE_LIMIT_REGISTER_WINDOW_SECONDS),
+            "email": RateLimit(settings.RATE_LIMIT_REGISTER_PER_EMAIL, settings.RATE_LIMIT_REGISTER_WINDOW_SECONDS),
+        },
+        "send_verification_email": {
+            "ip": RateLimit(settings.RATE_LIMIT_VERIFICATION_EMAIL_PER_IP,
+                            settings.RATE_LIMIT_VERIFICATION_EMAIL_WINDOW_SECONDS),
+            "email": RateLimit(settings.RATE_LIMIT_VERIFICATION_EMAIL_PER_EMAIL,
+                               settings.RATE_LIMIT_VERIFICATION_EMAIL_WINDOW_SECONDS),
+        },
+        "introspect": {
+            "ip": RateLimit(settings.RATE_LIMIT_INTROSPECT_PER_IP, settings.RATE_LIMIT_INTROSPECT_WINDOW_SECONDS),
+        },
+    },
+)
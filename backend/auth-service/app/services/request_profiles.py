@@ -0,0 +1,87 @@
+import asyncio
+from typing import Optional
+
+from app.config import settings
+from app.db.unit_of_work import UnitOfWork
+from app.exceptions import TokenInvalid
+from app.logger import logger
+from app.repositories.redisRepository import RedisRepository
+from app.repositories.tokensDenylist import access_tokens_denylist
+from app.utils.constants import ROLE_ADMIN_ID
+from app.utils.crypto import decode_token_with_public_keys
+from app.utils.key_manager import key_manager
+from app.utils.profiler import SamplingProfiler
+
+
+class RequestProfiles:
+    """Профилирование отдельных запросов по заголовку X-Profile.
+    Профайлер запускается только для администратора и только один на процесс;
+    результат хранится в Redis, чтобы его можно было забрать через любую реплику"""
+    KEY_PREFIX = "profile:"
+
+    def __init__(self, enabled: bool, interval: float, max_duration: float, ttl: int):
+        self.enabled = enabled
+        self.interval = interval
+        self.max_duration = max_duration
+        self.ttl = ttl
+        self._active = False
+
+    @property
+    def redis_repository(self) -> RedisRepository:
+        return RedisRepository()
+
+    @staticmethod
+    async def is_admin(access_token: Optional[str]) -> bool:
+        """Проверяет access-токен из запроса так же, как зависимость get_current_admin_user, но без исключений.
+        Вызывается из middleware для любого запроса с X-Profile: недоступность Redis или базы
+        не должна превращать его в 500, такой запрос просто выполняется без профайлера"""
+        if not access_token:
+            return False
+        try:
+            claims = decode_token_with_public_keys(access_token, key_manager.get_access_public_keys())
+        except TokenInvalid:
+            return False
+        if claims.get("type") != "access" or not claims.get("user_id"):
+            return False
+        try:
+            if await access_tokens_denylist.is_revoked(claims.get("jti")):
+                return False
+            async with UnitOfWork() as uow:
+                user = await uow.users.find_by_id(int(claims["user_id"]))
+        except Exception as exc:
+            logger.warning("Failed to check profiler access, profiling skipped: %s", exc)
+            return False
+        return user is not None and user.role_id == ROLE_ADMIN_ID
+
+    async def start(self, access_token: Optional[str]) -> Optional[SamplingProfiler]:
+        """Запускает профайлер, если он включён, свободен и запрос сделан администратором"""
+        if not self.enabled or self._active or not await self.is_admin(access_token):
+            return None
+        if self._active:  # пока шла проверка, профайлер мог занять другой запрос
+            return None
+        self._active = True
+        profiler = SamplingProfiler(interval=self.interval, max_duration=self.max_duration)
+        profiler.start()
+        return profiler
+
+    async def finish(self, profile_id: str, profiler: SamplingProfiler) -> None:
+        try:
+            # stop() ждёт завершения потока сэмплирования (до interval) — не в event loop
+            folded_stacks = await asyncio.to_thread(profiler.stop)
+        finally:
+            self._active = False
+        try:
+            await self.redis_repository.set_value(f"{self.KEY_PREFIX}{profile_id}", folded_stacks, ttl=self.ttl)
+        except Exception as exc:
+            logger.warning("Failed to save request profile %s: %s", profile_id, exc)
+            return
+        logger.info("Request profile %s saved, %s samples", profile_id, profiler.samples)
+
+    async def get(self, profile_id: str) -> Optional[str]:
+        return await self.redis_repository.get_value(f"{self.KEY_PREFIX}{profile_id}")
+
+
+request_profiles = RequestProfiles(enabled=settings.PROFILER_ENABLED,
+                                   interval=settings.PROFILER_INTERVAL_MS / 1000,
+                                   max_duration=settings.PROFILER_MAX_SECONDS,
+                                   ttl=settings.PROFILE_TTL_SECONDS)
@@ -1,52 +1,130 @@
+import asyncio
 from datetime import datetime, timezone, timedelta
+from typing import Any, Optional
+
+from fastapi import Response
 
 from app.config import settings
-from app.exceptions import RefreshTokenInvalid
-from app.repositories.tokensRepo import TokensRepository
-from app.utils.crypto import create_jwt_token, decode_token_with_public_keys
+from app.db.unit_of_work import UnitOfWork
+from app.exceptions import RefreshTokenInvalid, TokenInvalid, TokenRevoked, TokenExpired
+from app.models.refresh_tokens import USER_AGENT_MAX_LENGTH
+from app.repositories.tokensDenylist import access_tokens_denylist
+from app.repositories.tokensRepo import AbstractTokensRepository
+from app.repositories.usersRepo import UsersRepository
+from app.schemas import TokenIntrospection
+from app.tracing import span
+from app.utils.crypto import create_jwt_token, decode_token_with_public_keys, generate_token_id
 from app.utils.helpers import set_token_cookie
-from app.utils.key_manager import KeyManager
+from app.utils.key_manager import key_manager
+from app.utils.token_cache import access_token_cache
 
 
 class TokenService:
-    def __init__(self, token_repository: TokensRepository):
-        self.token_repository: TokensRepository = token_repository
-        self.key_manager = KeyManager()
+    def __init__(self, uow: UnitOfWork):
+        self.token_repository: AbstractTokensRepository = uow.tokens
+        self.users_repository: UsersRepository = uow.users
+        self.key_manager = key_manager
 
     async def generate_access_token(self, user_id: int) -> str:
         expires_at = (datetime.now(timezone.utc) + timedelta(
             minutes=int(settings.ACCESS_TOKEN_EXPIRE_TIME_MINUTES))).replace(tzinfo=None)
-        private_key = self.key_manager.get_access_private_key()
-        return create_jwt_token(user_id=user_id, token_type="access",
-                                private_key=private_key, expires_at=expires_at)
-
-    async def generate_refresh_token(self, user_id: int) -> str:
-        expires_at = (datetime.now(timezone.utc) + timedelta(
+        return await self._sign_token(user_id, "access", self.key_manager.get_access_signing_key(), expires_at)
+
+    @staticmethod
+    async def _sign_token(user_id: int, token_type: str, signing_key: tuple[str, Any], expires_at: datetime,
+                          token_id: Optional[str] = None) -> str:
+        """Подписывает токен; при JWT_SIGN_OFF_LOOP подпись выполняется в пуле потоков"""
+        key_id, private_key = signing_key
+        if settings.JWT_SIGN_OFF_LOOP:
+            return await asyncio.to_thread(create_jwt_token, user_id=user_id, token_type=token_type,
+                                           private_key=private_key, expires_at=expires_at, key_id=key_id,
+                                           token_id=token_id)
+        return create_jwt_token(user_id=user_id, token_type=token_type,
+                                private_key=private_key, expires_at=expires_at, key_id=key_id, token_id=token_id)
+
+    def decode_access_token(self, access_token: str) -> dict:
+        """Проверяет подпись и срок действия access-токена.
+        Если включён ACCESS_TOKEN_CACHE_ENABLED, повторная проверка одного и того же токена берётся из кэша"""
+        public_keys = self.key_manager.get_access_public_keys()
+        if not settings.ACCESS_TOKEN_CACHE_ENABLED:
+            return decode_token_with_public_keys(access_token, public_keys)
+
+        generation = self.key_manager.generation
+        claims = access_token_cache.get(access_token, generation)
+        if claims is None:
+            claims = decode_token_with_public_keys(access_token, public_keys)
+            access_token_cache.put(access_token, claims, generation)
+        return claims
+
+    async def check_access_token_revoked(self, claims: dict) -> None:
+        """Отклоняет отозванный access-токен. Для неотозванного токена обычно хватает локального Bloom-фильтра"""
+        if await access_tokens_denylist.is_revoked(claims.get("jti")):
+            raise TokenRevoked
+
+    async def revoke_access_token(self, claims: dict) -> None:
+        """Отзывает access-токен до истечения его срока действия"""
+        await access_tokens_denylist.revoke(claims.get("jti"), claims["exp"])
+
+    async def introspect_access_tokens(self, access_tokens: list[str]) -> list[TokenIntrospection]:
+        """Проверяет пачку access-токенов: подпись, срок, тип и отзыв — в памяти для каждого токена,
+        владельцы всех действительных токенов загружаются одним запросом. Порядок результатов совпадает с запросом"""
+        results = []
+        for access_token in access_tokens:
+            try:
+                claims = self.decode_access_token(access_token)
+                if claims.get("type") != "access" or not claims.get("user_id"):
+                    raise TokenInvalid
+                await self.check_access_token_revoked(claims)
+            except TokenInvalid as exc:
+                error = "expired" if isinstance(exc, TokenExpired) else \
+                    "revoked" if isinstance(exc, TokenRevoked) else "invalid"
+                results.append(TokenIntrospection(active=False, error=error))
+                continue
+            results.append(TokenIntrospection(active=True, user_id=int(claims["user_id"]),
+                                              jti=claims.get("jti"), exp=claims.get("exp")))
+
+        user_ids = [result.user_id for result in results if result.active]
+        users = await self.users_repository.find_by_ids(user_ids) if user_ids else {}
+        for result in results:
+            if not result.active:
+                continue
+            user = users.get(result.user_id)
+            if user is None:
+                result.active = False
+                result.error = "user_not_found"
+                continue
+            result.email = user.email
+            result.is_verified = user.is_verified
+            result.role_id = user.role_id
+        return results
+
+    @staticmethod
+    def get_refresh_token_expires_at() -> datetime:
+        return (datetime.now(timezone.utc) + timedelta(
             minutes=int(settings.REFRESH_TOKEN_EXPIRE_TIME_MINUTES))).replace(tzinfo=None)
-        private_key = self.key_manager.get_refresh_private_key()
-        refresh_token = create_jwt_token(user_id=user_id, token_type="refresh",
-                                         private_key=private_key, expires_at=expires_at)
-        await self.token_repository.save_refresh_token(user_id, refresh_token, expires_at)
-        return refresh_token
-
-    async def get_or_create_refresh_token(self, user_id):
-        """Проверяет существование и валидность Refresh-токена.
-        Если токен не существует или недействителен, создаёт новый."""
-        existing_token_record = await self.token_repository.get_refresh_token_by_user_id(user_id)
 
-        if existing_token_record:
-            is_valid = await self.token_repository.is_refresh_token_valid(existing_token_record.token)
-            if is_valid:
-                return existing_token_record.token
-            raise RefreshTokenInvalid
-
-        # Создаёт новый refresh-токен, если старый не найден
-        return await self.generate_refresh_token(user_id)
+    async def generate_refresh_token(self, user_id: int, token_id: str, expires_at: datetime) -> str:
+        """Подписывает refresh-токен с заданным jti. Сессия в хранилище ищется по jti,
+        поэтому её можно создать или ротировать до подписи"""
+        return await self._sign_token(user_id, "refresh", self.key_manager.get_refresh_signing_key(), expires_at,
+                                      token_id=token_id)
+
+    async def create_session(self, user_id: int, user_agent: Optional[str] = None) -> str:
+        """Открывает новую сессию устройства и возвращает её refresh-токен.
+        Сессии на других устройствах продолжают работать"""
+        token_id = generate_token_id()
+        expires_at = self.get_refresh_token_expires_at()
+        refresh_token = await self.generate_refresh_token(user_id, token_id, expires_at)
+        if user_agent:
+            user_agent = user_agent[:USER_AGENT_MAX_LENGTH]
+        await self.token_repository.create_session(user_id, token_id, expires_at, user_agent)
+        return refresh_token
 
-    async def generate_tokens_cookies(self, user_id, response):
-        # Генерирует токены для пользователя
-        access_token = await self.generate_access_token(user_id)
-        refresh_token = await self.get_or_create_refresh_token(user_id)
+    async def generate_tokens_cookies(self, user_id: int, response: Response, user_agent: Optional[str] = None):
+        # Генерирует токены для пользователя; каждый вход — отдельная сессия
+        with span("tokens.issue"):
+            access_token = await self.generate_access_token(user_id)
+            refresh_token = await self.create_session(user_id, user_agent)
 
         # Устанавливает токены в cookies
         set_token_cookie(response, "access", access_token)
@@ -54,20 +132,51 @@ class TokenService:
 
         return access_token, refresh_token
 
-    async def refresh_access_token(self, refresh_token: str) -> str:
-        if not await (self.token_repository.is_refresh_token_valid(refresh_token)):
-            raise RefreshTokenInvalid
-
-        # Декодируем refresh-токен previous и current public ключами
+    async def refresh_tokens(self, refresh_token: str) -> tuple[str, Optional[str]]:
+        """Выдаёт новую пару токенов по refresh-токену. Использованный refresh-токен сразу становится недействительным.
+        Если токен только что заменил параллельный запрос (вкладки, пачка XHR после истечения access-токена),
+        в течение REFRESH_TOKEN_REUSE_GRACE_SECONDS выдаётся только access-токен, а refresh — None:
+        новый refresh-токен клиент получает в ответе на запрос, который выполнил ротацию"""
+        with span("tokens.refresh"):
+            return await self._refresh_tokens(refresh_token)
+
+    async def _refresh_tokens(self, refresh_token: str) -> tuple[str, Optional[str]]:
+        # Сначала дешёвые проверки в памяти: подпись, срок действия и тип токена.
+        # Поддельный или просроченный токен не доходит до базы данных
         public_keys = self.key_manager.get_refresh_public_keys()
-        payload = decode_token_with_public_keys(refresh_token, public_keys)
+        try:
+            payload = decode_token_with_public_keys(refresh_token, public_keys)
+        except TokenInvalid:
+            raise RefreshTokenInvalid
 
-        if not payload:
+        if not payload or payload.get("type") != "refresh" or not payload.get("jti"):
             raise RefreshTokenInvalid
 
+        # Затем ротация одним запросом: не найден, истёк или уже использован — отказ.
+        # Новый токен подписывается только после успешной ротации: сессия хранит его jti, а не подпись
         user_id = int(payload["user_id"])
+        new_token_id = generate_token_id()
+        expires_at = self.get_refresh_token_expires_at()
+        if not await self.token_repository.rotate_refresh_token(user_id, payload["jti"], new_token_id, expires_at):
+            grace_seconds = settings.REFRESH_TOKEN_REUSE_GRACE_SECONDS
+            if grace_seconds <= 0 or not await self.token_repository.is_recently_rotated(user_id, payload["jti"],
+                                                                                           grace_seconds):
+                raise RefreshTokenInvalid
+            return await self.generate_access_token(user_id), None
+
+        new_refresh_token = await self.generate_refresh_token(user_id, new_token_id, expires_at)
         new_access_token = await self.generate_access_token(user_id)
-        return new_access_token
+        return new_access_token, new_refresh_token
 
     async def revoke_refresh_token(self, refresh_token: str) -> None:
-        await self.token_repository.delete_refresh_token(refresh_token)
+        """Завершает сессию refresh-токена. Для недействительного или просроченного токена ничего не делает"""
+        try:
+            payload = decode_token_with_public_keys(refresh_token, self.key_manager.get_refresh_public_keys())
+        except TokenInvalid:
+            return
+        if payload.get("type") == "refresh" and payload.get("jti"):
+            await self.token_repository.delete_refresh_token(payload["jti"])
+
+    async def revoke_all_sessions(self, user_id: int) -> int:
+        """Завершает сессии пользователя на всех устройствах"""
+        return await self.token_repository.delete_user_sessions(user_id)
@@ -0,0 +1,72 @@
+"""Лёгкие тайминги этапов запроса: сколько времени ушло на БД, bcrypt, JWT, Redis и т.д.
+
+Трейс создаёт TracingMiddleware и кладёт в contextvar; вне запроса span и record_span ничего не делают.
+Спаны с одним именем суммируются, результат уходит в заголовок Server-Timing и в лог медленных запросов."""
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+
+class Trace:
+    """Спаны одного запроса: имя -> [суммарная длительность, количество]"""
+    __slots__ = ("started", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans: dict[str, list] = {}
+
+    def add(self, name: str, duration: float) -> None:
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [duration, 1]
+        else:
+            entry[0] += duration
+            entry[1] += 1
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """Значение заголовка Server-Timing; total — время от начала запроса до отправки заголовков"""
+        entries = [f'{name};dur={duration * 1000:.2f};desc="x{count}"'
+                   for name, (duration, count) in self.spans.items()]
+        entries.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(entries)
+
+    def summary(self) -> dict:
+        return {name: {"ms": round(duration * 1000, 2), "count": count}
+                for name, (duration, count) in self.spans.items()}
+
+
+current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+
+
+def record_span(name: str, duration: float) -> None:
+    """Добавляет уже измеренную длительность (например, вместе с метрикой) в трейс текущего запроса"""
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add(name, duration)
+
+
+class Span:
+    """Контекстный менеджер для замера участка кода; работает и вокруг await"""
+    __slots__ = ("name", "trace", "started")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.trace = None
+        self.started = 0.0
+
+    def __enter__(self) -> "Span":
+        self.trace = current_trace.get()
+        if self.trace is not None:
+            self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.trace is not None:
+            self.trace.add(self.name, time.perf_counter() - self.started)
+
+
+def span(name: str) -> Span:
+    return Span(name)
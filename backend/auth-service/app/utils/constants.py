@@ -1,6 +1,7 @@
 TOKEN_ALGORITHM = "ES256"
 
 ROLE_ADMIN = "admin"
+ROLE_ADMIN_ID = 2
 ROLE_USER = "user"
 
 OAUTH_PROVIDER_MAPPING = {
@@ -1,37 +1,71 @@
+import hashlib
+import time
+import uuid
 from datetime import datetime
-
-from jose import jwt
+from typing import Any, Optional
 
 from app.exceptions import TokenInvalid, TokenExpired
-from app.utils.constants import TOKEN_ALGORITHM
+from app.metrics import JWT_DURATION
+from app.tracing import record_span
+from app.utils.jwt_codec import jwt_codec
+
+
+def get_token_digest(token: str) -> str:
+    """Возвращает sha256-дайджест токена фиксированной длины"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
 
 
-def decode_jwt(token: str, key: str) -> dict:
+def decode_jwt(token: str, key: Any) -> dict:
+    started = time.perf_counter()
     try:
-        return jwt.decode(token=token, key=key, algorithms=[TOKEN_ALGORITHM])
-    except jwt.ExpiredSignatureError:
-        raise TokenExpired
-    except jwt.JWTError:
-        raise TokenInvalid
-
-
-def decode_token_with_public_keys(token: str, keys: list) -> dict:
-    """Декодирует токен с использованием списка публичных ключей."""
-    for public_key in keys:
-        if public_key:
-            try:
-                decoded_token = decode_jwt(token, public_key)
-                return decoded_token
-            except Exception:
-                continue
+        return jwt_codec.decode(token, key)
+    finally:
+        duration = time.perf_counter() - started
+        JWT_DURATION.labels("verify").observe(duration)
+        record_span("jwt.verify", duration)
+
+
+def decode_token_with_public_keys(token: str, keys: dict[str, Any]) -> dict:
+    """Декодирует токен ключом, выбранным по kid из заголовка.
+    Токены без kid (выпущенные до его появления) проверяются перебором всех ключей."""
+    kid = jwt_codec.get_unverified_header(token).get("kid")
+
+    if kid is not None:
+        public_key = keys.get(kid)
+        if public_key is None:
+            raise TokenInvalid
+        return decode_jwt(token, public_key)
+
+    for public_key in keys.values():
+        try:
+            decoded_token = decode_jwt(token, public_key)
+            return decoded_token
+        except TokenExpired:
+            raise
+        except Exception:
+            continue
     raise TokenInvalid
 
 
+def generate_token_id() -> str:
+    """Уникальный id токена (jti): два токена одной секунды не совпадут"""
+    return uuid.uuid4().hex
+
+
 def create_jwt_token(user_id: int,
                      token_type: str,
-                     private_key: str,
-                     expires_at: datetime) -> str:
+                     private_key: Any,
+                     expires_at: datetime,
+                     key_id: str,
+                     token_id: Optional[str] = None) -> str:
     payload = {"user_id": str(user_id),
                "type": token_type,
+               "jti": token_id or generate_token_id(),
                "exp": expires_at}
-    return jwt.encode(claims=payload, key=private_key, algorithm=TOKEN_ALGORITHM)
+    started = time.perf_counter()
+    try:
+        return jwt_codec.encode(payload, private_key, key_id)
+    finally:
+        duration = time.perf_counter() - started
+        JWT_DURATION.labels("sign").observe(duration)
+        record_span("jwt.sign", duration)
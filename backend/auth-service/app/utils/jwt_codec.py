@@ -0,0 +1,192 @@
+import base64
+import binascii
+import calendar
+import json
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any
+
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.asymmetric.utils import decode_dss_signature, encode_dss_signature
+from jose import jwk, jwt
+from jose.exceptions import JWKError
+
+from app.config import settings
+from app.exceptions import TokenInvalid, TokenExpired
+from app.utils.constants import TOKEN_ALGORITHM
+
+# Размер координаты и половины подписи для P-256
+P256_COORDINATE_SIZE = 32
+
+
+class JWTCodec(ABC):
+    """Подпись и проверка ES256 JWT. Ключи разбираются один раз (KeyManager хранит результат load_key),
+    ошибки проверки приводятся к TokenInvalid / TokenExpired"""
+
+    @abstractmethod
+    def load_key(self, pem: str) -> Any:
+        """Разбирает PEM приватного или публичного ключа. Бросает ValueError, если ключ некорректен"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def public_jwk(self, key: Any) -> dict:
+        """Публичная часть ключа в виде JWK: kty, crv, x, y"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def encode(self, claims: dict, private_key: Any, key_id: str) -> str:
+        raise NotImplementedError
+
+    @abstractmethod
+    def decode(self, token: str, public_key: Any) -> dict:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_unverified_header(self, token: str) -> dict:
+        raise NotImplementedError
+
+
+class JoseCodec(JWTCodec):
+    """Реализация на python-jose"""
+
+    def load_key(self, pem: str) -> Any:
+        try:
+            return jwk.construct(pem, TOKEN_ALGORITHM)
+        except JWKError as exc:
+            raise ValueError(str(exc))
+
+    def public_jwk(self, key: Any) -> dict:
+        jwk_dict = (key if key.is_public() else key.public_key()).to_dict()
+        return {name: jwk_dict[name] for name in ("kty", "crv", "x", "y")}
+
+    def encode(self, claims: dict, private_key: Any, key_id: str) -> str:
+        return jwt.encode(claims=claims, key=private_key, algorithm=TOKEN_ALGORITHM, headers={"kid": key_id})
+
+    def decode(self, token: str, public_key: Any) -> dict:
+        try:
+            return jwt.decode(token=token, key=public_key, algorithms=[TOKEN_ALGORITHM])
+        except jwt.ExpiredSignatureError:
+            raise TokenExpired
+        except jwt.JWTError:
+            raise TokenInvalid
+
+    def get_unverified_header(self, token: str) -> dict:
+        try:
+            return jwt.get_unverified_header(token)
+        except jwt.JWTError:
+            raise TokenInvalid
+
+
+def b64url_encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64url_decode(data: str) -> bytes:
+    """Строгое base64url без паддинга: посторонние символы не игнорируются"""
+    try:
+        return base64.b64decode(data + "=" * (-len(data) % 4), altchars=b"-_", validate=True)
+    except (binascii.Error, ValueError):
+        raise TokenInvalid
+
+
+def json_segment(segment: str) -> dict:
+    try:
+        value = json.loads(b64url_decode(segment))
+    except ValueError:
+        raise TokenInvalid
+    if not isinstance(value, dict):
+        raise TokenInvalid
+    return value
+
+
+def numeric_date(value: Any) -> int:
+    """exp/nbf: datetime (naive — UTC) или число секунд"""
+    if isinstance(value, datetime):
+        return calendar.timegm(value.utctimetuple())
+    return value
+
+
+class CryptographyCodec(JWTCodec):
+    """Реализация напрямую на cryptography: ключи хранятся готовыми объектами EC,
+    подпись переводится из DER в формат JWS (r || s) и обратно.
+    Проверяются только алгоритм из заголовка, подпись, exp (обязателен) и nbf (если есть).
+    Не используется по умолчанию: включается JWT_ENGINE=cryptography"""
+
+    def load_key(self, pem: str) -> Any:
+        data = pem.encode("utf-8")
+        try:
+            if b"PRIVATE KEY" in data:
+                key = serialization.load_pem_private_key(data, password=None)
+            else:
+                key = serialization.load_pem_public_key(data)
+        except (ValueError, TypeError) as exc:
+            raise ValueError(str(exc))
+        if not isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) \
+                or not isinstance(key.curve, ec.SECP256R1):
+            raise ValueError(f"{TOKEN_ALGORITHM} requires a P-256 key")
+        return key
+
+    def public_jwk(self, key: Any) -> dict:
+        public_key = key.public_key() if isinstance(key, ec.EllipticCurvePrivateKey) else key
+        numbers = public_key.public_numbers()
+        return {
+            "kty": "EC",
+            "crv": "P-256",
+            "x": b64url_encode(numbers.x.to_bytes(P256_COORDINATE_SIZE, "big")).decode(),
+            "y": b64url_encode(numbers.y.to_bytes(P256_COORDINATE_SIZE, "big")).decode(),
+        }
+
+    def encode(self, claims: dict, private_key: Any, key_id: str) -> str:
+        header = {"alg": TOKEN_ALGORITHM, "typ": "JWT", "kid": key_id}
+        payload = {name: numeric_date(value) if name in ("exp", "nbf", "iat") else value
+                   for name, value in claims.items()}
+        signing_input = b".".join((b64url_encode(json.dumps(header, separators=(",", ":")).encode()),
+                                   b64url_encode(json.dumps(payload, separators=(",", ":")).encode())))
+        r, s = decode_dss_signature(private_key.sign(signing_input, ec.ECDSA(hashes.SHA256())))
+        signature = r.to_bytes(P256_COORDINATE_SIZE, "big") + s.to_bytes(P256_COORDINATE_SIZE, "big")
+        return b".".join((signing_input, b64url_encode(signature))).decode()
+
+    def decode(self, token: str, public_key: Any) -> dict:
+        try:
+            header_segment, payload_segment, signature_segment = token.split(".")
+        except ValueError:
+            raise TokenInvalid
+        if json_segment(header_segment).get("alg") != TOKEN_ALGORITHM:
+            raise TokenInvalid
+
+        signature = b64url_decode(signature_segment)
+        if len(signature) != 2 * P256_COORDINATE_SIZE:
+            raise TokenInvalid
+        der_signature = encode_dss_signature(int.from_bytes(signature[:P256_COORDINATE_SIZE], "big"),
+                                             int.from_bytes(signature[P256_COORDINATE_SIZE:], "big"))
+        try:
+            public_key.verify(der_signature, f"{header_segment}.{payload_segment}".encode("ascii"),
+                              ec.ECDSA(hashes.SHA256()))
+        except (InvalidSignature, UnicodeEncodeError):
+            raise TokenInvalid
+
+        claims = json_segment(payload_segment)
+        now = time.time()
+        exp = claims.get("exp")
+        if not isinstance(exp, (int, float)) or isinstance(exp, bool):
+            raise TokenInvalid
+        if exp < int(now):
+            raise TokenExpired
+        nbf = claims.get("nbf")
+        if nbf is not None and (not isinstance(nbf, (int, float)) or isinstance(nbf, bool) or nbf > now):
+            raise TokenInvalid
+        return claims
+
+    def get_unverified_header(self, token: str) -> dict:
+        return json_segment(token.split(".", 1)[0])
+
+
+JWT_ENGINES: dict[str, type[JWTCodec]] = {
+    "jose": JoseCodec,
+    "cryptography": CryptographyCodec,
+}
+
+jwt_codec: JWTCodec = JWT_ENGINES[settings.JWT_ENGINE]()
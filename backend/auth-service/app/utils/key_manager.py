@@ -1,68 +1,195 @@
+import base64
+import hashlib
+import json
 import os
 import re
 import subprocess
-from typing import Optional
+import time
+from typing import Any, Optional
+
+from app.config import settings
+from app.logger import logger
+from app.utils.constants import TOKEN_ALGORITHM
+from app.utils.jwt_codec import jwt_codec
+
+# Учитываем многострочные ключи
+KEYS_PATTERN = re.compile(r'(\w+)=(".*?")', re.DOTALL)
+
+TOKEN_TYPES = ("ACCESS", "REFRESH")
+
+
+def get_key_id(key: Any) -> str:
+    """Возвращает kid ключа — JWK thumbprint по RFC 7638 (одинаковый для приватного и публичного ключа пары)"""
+    thumbprint_input = jwt_codec.public_jwk(key)
+    digest = hashlib.sha256(json.dumps(thumbprint_input, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def previous_key_name(token_type: str, index: int) -> str:
+    """PREVIOUS_ACCESS_PUBLIC_KEY, PREVIOUS_ACCESS_PUBLIC_KEY_2, PREVIOUS_ACCESS_PUBLIC_KEY_3, ..."""
+    name = f"PREVIOUS_{token_type}_PUBLIC_KEY"
+    return name if index == 1 else f"{name}_{index}"
 
 
 class KeyManager:
+    """Общий на процесс набор ключей.
+    Хранит уже разобранные объекты ключей, сгруппированные по kid,
+    и перечитывает KEYS_FILE только при изменении его mtime и содержимого."""
     KEYS_FILE = ".env.keys"
 
-    def __init__(self):
-        self.keys = self._load_keys()
+    def __init__(self, reload_check_interval: float = 0):
+        self.reload_check_interval = reload_check_interval
+        self.keys: dict[str, str] = {}
+        self.public_keys: dict[str, dict[str, Any]] = {token_type: {} for token_type in TOKEN_TYPES}
+        self.signing_keys: dict[str, tuple[str, Any]] = {}
+        self.generation = 0  # увеличивается при каждой фактической смене ключей
+        self.access_jwks: tuple[bytes, str] = self._build_jwks({})
+        self._mtime: Optional[int] = None
+        self._content_hash: Optional[str] = None
+        self._last_check = 0.0
+        self.reload()
+
+    def _load_keys(self, content: str) -> dict[str, str]:
+        """Разбирает содержимое KEYS_FILE"""
+        return {key: value.strip('"') for key, value in KEYS_PATTERN.findall(content)}
 
-    def _load_keys(self):
-        """Загружает ключи из KEYS_FILE"""
-        keys = {}
-        if os.path.exists(self.KEYS_FILE):
-            with open(self.KEYS_FILE, "r") as f:
-                content = f.read()
-            # Учитываем многострочные ключи
-            pattern = re.compile(r'(\w+)=(".*?")', re.DOTALL)
-            keys = {key: value.strip('"') for key, value in pattern.findall(content)}
-        return keys
+    @staticmethod
+    def _parse_key(key_name: str, pem: str) -> Optional[Any]:
+        if not pem:
+            return None
+        try:
+            return jwt_codec.load_key(pem)
+        except ValueError:
+            logger.error("Failed to parse key %s from keys file", key_name)
+            return None
+
+    @staticmethod
+    def _public_key_names(keys: dict[str, str], token_type: str) -> list[str]:
+        """Имена публичных ключей: сначала текущий, затем предыдущие от новых к старым"""
+        previous = re.compile(rf"PREVIOUS_{token_type}_PUBLIC_KEY(?:_(\d+))?")
+        previous_names = sorted((name for name in keys if previous.fullmatch(name)),
+                                key=lambda name: int(previous.fullmatch(name).group(1) or 1))
+        return [f"{token_type}_PUBLIC_KEY", *previous_names]
+
+    def _build_keyrings(self, keys: dict[str, str]) -> None:
+        public_keys = {}
+        signing_keys = {}
+        for token_type in TOKEN_TYPES:
+            keyring = {}
+            for name in self._public_key_names(keys, token_type):
+                key = self._parse_key(name, keys.get(name, ""))
+                if key is not None:
+                    keyring.setdefault(get_key_id(key), key)
+            public_keys[token_type] = keyring
+
+            private_name = f"{token_type}_PRIVATE_KEY"
+            private_key = self._parse_key(private_name, keys.get(private_name, ""))
+            if private_key is not None:
+                signing_keys[token_type] = (get_key_id(private_key), private_key)
+        self.public_keys = public_keys
+        self.signing_keys = signing_keys
+
+    @staticmethod
+    def _build_jwks(keyring: dict[str, Any]) -> tuple[bytes, str]:
+        """Готовое тело JWKS и его strong ETag: считаются один раз на поколение ключей, а не на каждый запрос"""
+        jwks = {"keys": [{**jwt_codec.public_jwk(key), "kid": kid, "use": "sig", "alg": TOKEN_ALGORITHM}
+                         for kid, key in keyring.items()]}
+        body = json.dumps(jwks, separators=(",", ":")).encode("utf-8")
+        return body, f'"{hashlib.sha256(body).hexdigest()}"'
+
+    def reload(self, force: bool = False) -> bool:
+        """Перечитывает KEYS_FILE, если он изменился. Возвращает True, если ключи обновились"""
+        self._last_check = time.monotonic()
+        try:
+            mtime = os.stat(self.KEYS_FILE).st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if not force and mtime == self._mtime:
+            return False
+        with open(self.KEYS_FILE, "r") as f:
+            content = f.read()
+        self._mtime = mtime
+        content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        if not force and content_hash == self._content_hash:
+            return False
+
+        keys = self._load_keys(content)
+        self._build_keyrings(keys)
+        self.access_jwks = self._build_jwks(self.public_keys["ACCESS"])
+        self.keys = keys
+        self._content_hash = content_hash
+        self.generation += 1
+        return True
+
+    def _reload_if_due(self) -> None:
+        if time.monotonic() - self._last_check >= self.reload_check_interval:
+            self.reload()
 
     def get_key(self, key_name: str) -> Optional[str]:
         """Возвращает ключ по имени"""
+        self._reload_if_due()
         return self.keys.get(key_name)
 
-    def get_access_public_keys(self):
-        """Возвращает текущий + предыдущий публичный ключ для ACCESS-токена"""
-        return self.get_key("ACCESS_PUBLIC_KEY"), self.get_key("PREVIOUS_ACCESS_PUBLIC_KEY")
+    def get_public_keys(self, token_type: str) -> dict[str, Any]:
+        """Возвращает публичные ключи {kid: ключ}: текущий и все сохранённые предыдущие"""
+        self._reload_if_due()
+        return self.public_keys[token_type]
+
+    def get_signing_key(self, token_type: str) -> tuple[str, Any]:
+        """Возвращает (kid, приватный ключ) для подписи токенов"""
+        self._reload_if_due()
+        return self.signing_keys[token_type]
+
+    def get_access_public_keys(self) -> dict[str, Any]:
+        """Возвращает текущий + предыдущие публичные ключи для ACCESS-токена"""
+        return self.get_public_keys("ACCESS")
 
-    def get_access_private_key(self):
-        """Возвращает приватный ключ для ACCESS-токена"""
-        return self.get_key("ACCESS_PRIVATE_KEY")
+    def get_access_signing_key(self) -> tuple[str, Any]:
+        """Возвращает kid и приватный ключ для ACCESS-токена"""
+        return self.get_signing_key("ACCESS")
 
-    def get_refresh_public_keys(self):
-        """Возвращает текущий + предыдущий публичный ключ для REFRESH-токена"""
-        return self.get_key("REFRESH_PUBLIC_KEY"), self.get_key("PREVIOUS_REFRESH_PUBLIC_KEY")
+    def get_access_jwks(self) -> tuple[bytes, str]:
+        """Возвращает JWKS с публичными ключами ACCESS-токена (текущий + предыдущие) и его ETag.
+        REFRESH-ключи наружу не публикуются: refresh-токены проверяет только этот сервис"""
+        self._reload_if_due()
+        return self.access_jwks
 
-    def get_refresh_private_key(self):
-        """Возвращает приватный ключ для REFRESH-токена"""
-        return self.get_key("REFRESH_PRIVATE_KEY")
+    def get_refresh_public_keys(self) -> dict[str, Any]:
+        """Возвращает текущий + предыдущие публичные ключи для REFRESH-токена"""
+        return self.get_public_keys("REFRESH")
+
+    def get_refresh_signing_key(self) -> tuple[str, Any]:
+        """Возвращает kid и приватный ключ для REFRESH-токена"""
+        return self.get_signing_key("REFRESH")
 
     def rotate_keys(self):
-        """Ротация ключей: ACCESS и REFRESH"""
+        """Ротация ключей: ACCESS и REFRESH.
+        Текущий публичный ключ становится предыдущим, хранится KEYS_PREVIOUS_TO_KEEP предыдущих ключей"""
+        self.reload()
         existing_keys = self.keys
 
-        # Сохраняем предыдущие публичные ключи
-        old_access_public = existing_keys.get("ACCESS_PUBLIC_KEY", "")
-        old_refresh_public = existing_keys.get("REFRESH_PUBLIC_KEY", "")
-
-        # Генерируем новые ключи
-        new_access_private, new_access_public = self.generate_es256_keys()
-        new_refresh_private, new_refresh_public = self.generate_es256_keys()
-
-        # Обновляем файл .env.keys
-        with open(self.KEYS_FILE, "w") as f:
-            f.write(
-                f'ACCESS_PRIVATE_KEY="{new_access_private}"\n'
-                f'ACCESS_PUBLIC_KEY="{new_access_public}"\n'
-                f'PREVIOUS_ACCESS_PUBLIC_KEY="{old_access_public}"\n'
-                f'REFRESH_PRIVATE_KEY="{new_refresh_private}"\n'
-                f'REFRESH_PUBLIC_KEY="{new_refresh_public}"\n'
-                f'PREVIOUS_REFRESH_PUBLIC_KEY="{old_refresh_public}"\n'
-            )
+        lines = []
+        for token_type in TOKEN_TYPES:
+            # Сохраняем предыдущие публичные ключи: текущий становится первым из предыдущих
+            previous_keys = [existing_keys.get(name, "")
+                             for name in self._public_key_names(existing_keys, token_type)]
+            previous_keys = [key for key in previous_keys if key][:settings.KEYS_PREVIOUS_TO_KEEP] or [""]
+
+            # Генерируем новые ключи
+            new_private, new_public = self.generate_es256_keys()
+
+            lines.append(f'{token_type}_PRIVATE_KEY="{new_private}"\n')
+            lines.append(f'{token_type}_PUBLIC_KEY="{new_public}"\n')
+            for index, previous_key in enumerate(previous_keys, start=1):
+                lines.append(f'{previous_key_name(token_type, index)}="{previous_key}"\n')
+
+        # Обновляем файл .env.keys атомарно, чтобы другие воркеры не прочитали его наполовину записанным
+        tmp_file = f"{self.KEYS_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            f.writelines(lines)
+
+        os.replace(tmp_file, self.KEYS_FILE)
+        self.reload(force=True)
 
         print("🔑 Ключи обновлены и сохранены в .env.keys!")
 
@@ -80,3 +207,6 @@ class KeyManager:
         ).stdout.strip()
 
         return private_key, public_key
+
+
+key_manager = KeyManager(reload_check_interval=settings.KEYS_RELOAD_CHECK_INTERVAL_SECONDS)
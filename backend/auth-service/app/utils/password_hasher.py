@@ -0,0 +1,76 @@
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from app.config import settings
+from app.exceptions import ServiceOverloaded
+from app.metrics import PASSWORD_HASH_DURATION, PASSWORD_HASHER_QUEUE_DEPTH
+from app.tracing import record_span
+from app.utils.helpers import generate_hashed_password, check_password
+
+
+class PasswordHasher:
+    """Выполняет bcrypt в отдельном пуле, чтобы не блокировать event loop.
+    Количество ожидающих задач ограничено max_queue_size: при переполнении запрос сразу отклоняется."""
+
+    def __init__(self, executor_type: str, max_workers: int, max_queue_size: int):
+        self.executor_type = executor_type
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor: Executor | None = None
+        self._pending = 0
+
+    @property
+    def queue_depth(self) -> int:
+        """Количество задач, которые выполняются или ждут свободного воркера"""
+        return self._pending
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == "process":
+                # spawn вместо fork: процесс uvicorn уже многопоточный
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix="password-hasher")
+        return self._executor
+
+    async def _run(self, operation: str, func, *args):
+        if self._pending >= self.max_queue_size:
+            raise ServiceOverloaded
+        self._pending += 1
+        PASSWORD_HASHER_QUEUE_DEPTH.inc()
+        started = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._pending -= 1
+            PASSWORD_HASHER_QUEUE_DEPTH.dec()
+            duration = time.perf_counter() - started
+            PASSWORD_HASH_DURATION.labels(operation).observe(duration)
+            record_span(f"bcrypt.{operation}", duration)
+
+    async def hash_password(self, password: str) -> dict:
+        """Асинхронный аналог generate_hashed_password"""
+        return await self._run("hash", generate_hashed_password, password)
+
+    async def check_password(self, entered_password: str, stored_hashed_password: str, stored_salt: str) -> bool:
+        """Асинхронный аналог check_password"""
+        return await self._run("verify", check_password, entered_password, stored_hashed_password, stored_salt)
+
+    def start(self) -> None:
+        """Создаёт пул заранее, чтобы первый логин не платил за запуск воркеров"""
+        self._get_executor()
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(executor_type=settings.PASSWORD_HASHER_EXECUTOR,
+                                 max_workers=settings.PASSWORD_HASHER_MAX_WORKERS,
+                                 max_queue_size=settings.PASSWORD_HASHER_MAX_QUEUE_SIZE)
@@ -0,0 +1,70 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Потоки, стоящие в этих модулях, простаивают (ждут задачу или запись в очередь) и в профиль не попадают.
+# Для потока event loop ожидание в selectors остаётся: это время ввода-вывода запроса
+IDLE_MODULES = ("threading.py", "queue.py", os.path.join("concurrent", "futures", "thread.py"), "selectors.py")
+
+
+def frame_name(frame) -> str:
+    return f"{os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_qualname}"
+
+
+def is_idle(frame) -> bool:
+    return frame.f_code.co_filename.endswith(IDLE_MODULES)
+
+
+class SamplingProfiler:
+    """Сэмплирующий профайлер: отдельный поток раз в interval секунд снимает стеки потока event loop
+    и занятых рабочих потоков (bcrypt, to_thread) через sys._current_frames.
+    Результат — folded stacks ("поток;файл:функция;... количество"), формат flamegraph.pl и speedscope.
+    В стек потока event loop попадают и другие запросы, выполнявшиеся одновременно с профилируемым"""
+
+    def __init__(self, interval: float, max_duration: float):
+        self.interval = interval
+        self.max_duration = max_duration
+        self.stacks: Counter[str] = Counter()
+        self.samples = 0
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._thread_names: dict[int, str] = {}
+
+    def start(self) -> None:
+        """Запускается из потока event loop: он считается основным профилируемым потоком"""
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> str:
+        """Останавливает сэмплирование и возвращает folded stacks"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+    def _thread_name(self, thread_id: int) -> str:
+        name = self._thread_names.get(thread_id)
+        if name is None:
+            self._thread_names = {thread.ident: thread.name for thread in threading.enumerate()}
+            name = self._thread_names.get(thread_id, str(thread_id))
+        return "event-loop" if thread_id == self._loop_thread_id else name
+
+    def _run(self) -> None:
+        own_thread_id = threading.get_ident()
+        deadline = time.monotonic() + self.max_duration
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_thread_id or (thread_id != self._loop_thread_id and is_idle(frame)):
+                    continue
+                names = []
+                while frame is not None:
+                    names.append(frame_name(frame))
+                    frame = frame.f_back
+                names.append(self._thread_name(thread_id))
+                self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
@@ -0,0 +1,55 @@
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.config import settings
+from app.utils.crypto import get_token_digest
+
+
+class VerifiedTokenCache:
+    """LRU-кэш уже проверенных токенов: дайджест токена -> claims.
+    Запись живёт не дольше exp токена, весь кэш сбрасывается при смене поколения ключей."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._generation: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str, generation: int) -> Optional[dict]:
+        if generation != self._generation:
+            self.clear()
+            self._generation = generation
+
+        digest = get_token_digest(token)
+        claims = self._entries.get(digest)
+        if claims is None:
+            self.misses += 1
+            return None
+        if claims["exp"] <= time.time():
+            del self._entries[digest]
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(digest)
+        self.hits += 1
+        return claims
+
+    def put(self, token: str, claims: dict, generation: int) -> None:
+        if generation != self._generation or "exp" not in claims:
+            return
+        digest = get_token_digest(token)
+        self._entries[digest] = claims
+        self._entries.move_to_end(digest)
+        if len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+access_token_cache = VerifiedTokenCache(max_size=settings.ACCESS_TOKEN_CACHE_MAX_SIZE)
@@ -0,0 +1,85 @@
+"""Воркер отправки писем из email_outbox.
+
+Запуск: python -m app.workers.email_outbox_worker
+Воркеры масштабируются независимо от API: несколько экземпляров забирают разные письма благодаря SKIP LOCKED."""
+import asyncio
+import signal
+from datetime import datetime, timezone, timedelta
+from email.message import EmailMessage
+
+from app.config import settings
+from app.db.unit_of_work import UnitOfWork
+from app.logger import logger
+from app.models.email_outbox import EmailOutbox
+from app.services.email_delivery import SMTPConnection
+
+
+def build_email_message(outbox_message: EmailOutbox) -> EmailMessage:
+    message = EmailMessage()
+    message["From"] = settings.SMTP_SENDER
+    message["To"] = outbox_message.recipient
+    message["Subject"] = outbox_message.subject
+    message.set_content(outbox_message.body)
+    return message
+
+
+async def process_batch(connection: SMTPConnection) -> int:
+    """Отправляет одну пачку писем. Возвращает количество взятых в работу писем"""
+    # Короткая транзакция на захват: блокировки строк не держатся во время отправки
+    async with UnitOfWork() as uow:
+        outbox_messages = await uow.email_outbox.claim_batch(batch_size=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                                                             lease_seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS,
+                                                             max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+    if not outbox_messages:
+        return 0
+
+    sent_ids = []
+    failures = []
+    for outbox_message in outbox_messages:
+        try:
+            await connection.send(build_email_message(outbox_message))
+            sent_ids.append(outbox_message.id)
+        except Exception as exc:
+            retry_at = (datetime.now(timezone.utc) + timedelta(
+                seconds=settings.EMAIL_RETRY_BACKOFF_SECONDS * 2 ** outbox_message.attempts)).replace(tzinfo=None)
+            logger.warning("Failed to send outbox email %s (attempt %s): %s",
+                           outbox_message.id, outbox_message.attempts, exc)
+            failures.append((outbox_message.id, str(exc), retry_at))
+
+    async with UnitOfWork() as uow:
+        await uow.email_outbox.mark_sent(sent_ids)
+        for message_id, error, retry_at in failures:
+            await uow.email_outbox.mark_failed(message_id, error, retry_at)
+    if sent_ids:
+        logger.info("Sent %s outbox emails", len(sent_ids))
+    return len(outbox_messages)
+
+
+async def run_worker() -> None:
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+
+    connection = SMTPConnection()
+    logger.info("Email outbox worker started")
+    try:
+        while not stop_event.is_set():
+            try:
+                claimed = await process_batch(connection)
+            except Exception as exc:
+                logger.error("Email outbox batch failed: %s", exc, exc_info=True)
+                claimed = 0
+            # Полная пачка — скорее всего есть ещё письма, берём следующую сразу
+            if claimed < settings.EMAIL_OUTBOX_BATCH_SIZE:
+                try:
+                    await asyncio.wait_for(stop_event.wait(), timeout=settings.EMAIL_OUTBOX_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+    finally:
+        await connection.close()
+        logger.info("Email outbox worker stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(run_worker())
@@ -0,0 +1,151 @@
+"""Периодическая очистка: истёкшие сессии, неверифицированные пользователи, отправленные письма из outbox.
+
+Работает как фоновая задача lifespan (MAINTENANCE_ENABLED) или отдельно:
+    python -m app.workers.maintenance                  — один проход по всем задачам
+    python -m app.workers.maintenance --loop           — по расписанию, как в lifespan
+    python -m app.workers.maintenance --jobs sent_emails
+Строки удаляются короткими пачками, а advisory lock Postgres гарантирует, что проход выполняет только одна реплика."""
+import argparse
+import asyncio
+import random
+import signal
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone, timedelta
+from typing import AsyncIterator, Awaitable, Callable, Optional
+
+from sqlalchemy import text
+
+from app.config import settings
+from app.db.db import engine
+from app.db.unit_of_work import UnitOfWork
+from app.logger import logger
+from app.metrics import MAINTENANCE_ROWS_REMOVED
+
+# Произвольный, но постоянный ключ advisory lock для задач очистки
+MAINTENANCE_LOCK_ID = 815_274_301
+
+
+def _days_ago(days: int) -> datetime:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).replace(tzinfo=None)
+
+
+async def delete_expired_sessions(uow: UnitOfWork, batch_size: int) -> int:
+    return await uow.tokens.delete_expired_sessions(batch_size)
+
+
+async def delete_stale_unverified_users(uow: UnitOfWork, batch_size: int) -> int:
+    user_ids = await uow.users.delete_stale_unverified(_days_ago(settings.UNVERIFIED_USER_RETENTION_DAYS),
+                                                       batch_size)
+    # Сессии в Redis не видны условию «нет ни одной сессии» и не удаляются каскадом вместе с пользователем
+    if settings.REFRESH_TOKEN_STORE == "redis":
+        for user_id in user_ids:
+            await uow.tokens.delete_user_sessions(user_id)
+    return len(user_ids)
+
+
+async def delete_sent_emails(uow: UnitOfWork, batch_size: int) -> int:
+    return await uow.email_outbox.delete_sent(_days_ago(settings.EMAIL_OUTBOX_RETENTION_DAYS), batch_size)
+
+
+MAINTENANCE_JOBS: dict[str, Callable[[UnitOfWork, int], Awaitable[int]]] = {
+    "expired_sessions": delete_expired_sessions,
+    "stale_unverified_users": delete_stale_unverified_users,
+    "sent_emails": delete_sent_emails,
+}
+
+
+@asynccontextmanager
+async def advisory_lock(lock_id: int) -> AsyncIterator[bool]:
+    """Пытается взять сессионный advisory lock на отдельном соединении. Возвращает False, если он занят.
+    Если процесс упадёт, Postgres снимет блокировку вместе с соединением"""
+    async with engine.connect() as connection:
+        acquired = await connection.scalar(text("SELECT pg_try_advisory_lock(:lock_id)"), {"lock_id": lock_id})
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                await connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": lock_id})
+
+
+async def run_job(name: str, stop_event: Optional[asyncio.Event] = None) -> int:
+    """Удаляет строки пачками, каждая пачка — отдельная транзакция. Возвращает общее количество удалённых строк"""
+    job = MAINTENANCE_JOBS[name]
+    batch_size = settings.MAINTENANCE_BATCH_SIZE
+    total = 0
+    while True:
+        async with UnitOfWork() as uow:
+            removed = await job(uow, batch_size)
+        total += removed
+        MAINTENANCE_ROWS_REMOVED.labels(name).inc(removed)
+        if removed < batch_size or (stop_event is not None and stop_event.is_set()):
+            break
+        # Пауза между пачками, чтобы очистка не конкурировала с запросами пользователей
+        await asyncio.sleep(settings.MAINTENANCE_BATCH_PAUSE_SECONDS)
+    return total
+
+
+async def run_maintenance(jobs: Optional[list[str]] = None,
+                          stop_event: Optional[asyncio.Event] = None) -> Optional[dict[str, int]]:
+    """Один проход по задачам очистки. Возвращает {задача: удалено строк} или None, если проход уже идёт на другой реплике"""
+    async with advisory_lock(MAINTENANCE_LOCK_ID) as acquired:
+        if not acquired:
+            logger.info("Maintenance is already running on another replica, skipping")
+            return None
+
+        removed = {}
+        for name in jobs or MAINTENANCE_JOBS:
+            if stop_event is not None and stop_event.is_set():
+                break
+            try:
+                removed[name] = await run_job(name, stop_event)
+            except Exception as exc:
+                logger.error("Maintenance job %s failed: %s", name, exc, exc_info=True)
+                continue
+            logger.info("Maintenance job %s removed %s rows", name, removed[name])
+        return removed
+
+
+async def _wait(stop_event: asyncio.Event, timeout: float) -> bool:
+    """Ждёт timeout секунд. Возвращает True, если за это время пришёл сигнал остановки"""
+    try:
+        await asyncio.wait_for(stop_event.wait(), timeout=timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def run_scheduler(stop_event: asyncio.Event, jobs: Optional[list[str]] = None) -> None:
+    """Запускает очистку каждые MAINTENANCE_INTERVAL_SECONDS.
+    Случайная добавка до MAINTENANCE_JITTER_SECONDS разводит реплики, стартовавшие одновременно"""
+    delay = random.uniform(0, settings.MAINTENANCE_JITTER_SECONDS)
+    while not await _wait(stop_event, delay):
+        try:
+            await run_maintenance(jobs, stop_event)
+        except Exception as exc:
+            logger.error("Maintenance run failed: %s", exc, exc_info=True)
+        delay = settings.MAINTENANCE_INTERVAL_SECONDS + random.uniform(0, settings.MAINTENANCE_JITTER_SECONDS)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Auth-service database maintenance")
+    parser.add_argument("--loop", action="store_true", help="run on schedule until SIGINT/SIGTERM")
+    parser.add_argument("--jobs", nargs="+", choices=list(MAINTENANCE_JOBS), help="jobs to run (default: all)")
+    args = parser.parse_args()
+
+    if not args.loop:
+        removed = await run_maintenance(args.jobs)
+        if removed is not None:
+            logger.info("Maintenance finished: %s", removed)
+        return
+
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop_event.set)
+    logger.info("Maintenance scheduler started")
+    await run_scheduler(stop_event, args.jobs)
+    logger.info("Maintenance scheduler stopped")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
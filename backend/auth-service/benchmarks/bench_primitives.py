@@ -0,0 +1,353 @@
+"""Микробенчмарки криптографических примитивов и хеширования паролей.
+
+Каждый примитив измеряется в двух режимах:
+  * однопоточно — время одной операции (медиана и минимум по раундам);
+  * под конкурентной нагрузкой asyncio — пропускная способность и то, насколько вызов блокирует event loop
+    (задержка срабатывания таймера-"пульса" с интервалом 1 мс).
+
+Запуск из backend/auth-service (ключи генерируются в памяти, БД/Redis/SMTP не нужны):
+    python -m benchmarks.bench_primitives                   # таблица результатов
+    python -m benchmarks.bench_primitives --filter jwt      # только бенчмарки с "jwt" в имени
+    python -m benchmarks.bench_primitives --json result.json
+    python -m benchmarks.bench_primitives --check           # сравнить с baseline.json, код 1 при регрессии
+    python -m benchmarks.bench_primitives --save-baseline   # перезаписать baseline.json
+
+--check сравнивает минимум по раундам (медиана на загруженной или одноядерной машине гуляет на десятки процентов),
+поделённый на время эталонного бенчмарка reference.cpu из того же запуска: общее замедление машины сокращается.
+Подозрение на регрессию перепроверяется повторными замерами (--confirm-runs) и считается регрессией,
+только если воспроизвелось в каждом из них.
+Базовые значения зависят от машины: после смены железа или CI-раннера baseline нужно пересохранить.
+При ротации ключей, обновлении python-jose/bcrypt/cryptography к изменению прикладывается вывод --check.
+Бенчмарки jwt.* используют движок из JWT_ENGINE, jwt_engine.* сравнивают все движки между собой."""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+DEFAULT_THRESHOLD = 0.25  # допустимое замедление относительно baseline (минимум по раундам, нормированный эталоном)
+DEFAULT_CONFIRM_RUNS = 2  # сколько повторных замеров должны подтвердить регрессию
+FAST_ROUNDS = 25  # раундов для быстрых примитивов: минимум по ним устойчив к шуму соседних процессов
+REFERENCE_BENCHMARK = "reference.cpu"
+
+
+def generate_key_pair() -> tuple[str, str]:
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM,
+                                            serialization.PrivateFormat.TraditionalOpenSSL,
+                                            serialization.NoEncryption()).decode()
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private_pem, public_pem
+
+
+def configure_environment() -> None:
+    """Обязательные настройки приложения, чтобы импорт app.* не требовал .env (ключи бенчмарк генерирует сам)"""
+    defaults = {
+        "LOG_LEVEL": "WARNING",
+        "DB_HOST": "localhost", "DB_PORT": "5432", "DB_USER": "bench", "DB_PASS": "bench", "DB_NAME": "bench",
+        "REDIS_URL": "redis://localhost:6379/0",
+        "SMTP_HOST": "localhost", "SMTP_PORT": "1025", "SMTP_SENDER": "bench@example.com", "SMTP_PASSWORD": "",
+        "VERIFICATION_TOKEN_EXPIRE_TIME_MINUTES": "60",
+        "ACCESS_TOKEN_EXPIRE_TIME_MINUTES": "15",
+        "REFRESH_TOKEN_EXPIRE_TIME_MINUTES": "1440",
+        "GOOGLE_CLIENT_ID": "", "GOOGLE_CLIENT_SECRET": "", "YANDEX_CLIENT_ID": "", "YANDEX_CLIENT_SECRET": "",
+    }
+    for token_type in ("ACCESS", "REFRESH"):
+        for name in ("PRIVATE_KEY", "PUBLIC_KEY"):
+            defaults[f"{token_type}_{name}"] = ""
+        defaults[f"PREVIOUS_{token_type}_PUBLIC_KEY"] = ""
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+
+configure_environment()
+
+from fastapi import Response  # noqa: E402
+from jose import jwt  # noqa: E402
+
+from app.utils.constants import TOKEN_ALGORITHM  # noqa: E402
+from app.utils.crypto import create_jwt_token, decode_jwt, decode_token_with_public_keys  # noqa: E402
+from app.utils.jwt_codec import JWT_ENGINES, jwt_codec  # noqa: E402
+from app.utils.helpers import generate_hashed_password, check_password, set_token_cookie  # noqa: E402
+from app.utils.key_manager import get_key_id  # noqa: E402
+from app.utils.password_hasher import PasswordHasher  # noqa: E402
+
+
+@dataclass
+class Benchmark:
+    name: str
+    func: Callable[[], object]
+    number: int  # операций в одном раунде
+    rounds: int
+    async_func: Optional[Callable[[], Awaitable[object]]] = None  # асинхронный вариант для режима asyncio
+    concurrency_ops: int = 0  # операций на задачу в режиме asyncio (0 — как number)
+
+
+def build_benchmarks() -> list[Benchmark]:
+    current_private_pem, current_public_pem = generate_key_pair()
+    previous_private_pem, previous_public_pem = generate_key_pair()
+    signing_key = jwt_codec.load_key(current_private_pem)
+    current_public = jwt_codec.load_key(current_public_pem)
+    previous_signing = jwt_codec.load_key(previous_private_pem)
+    previous_public = jwt_codec.load_key(previous_public_pem)
+    public_keys = {get_key_id(current_public): current_public, get_key_id(previous_public): previous_public}
+
+    expires_at = (datetime.now(timezone.utc) + timedelta(hours=1)).replace(tzinfo=None)
+    current_token = create_jwt_token(1, "access", signing_key, expires_at, get_key_id(signing_key))
+    previous_token = create_jwt_token(1, "access", previous_signing, expires_at, get_key_id(previous_signing))
+    # Токен без kid (выпущен до его появления): ключ подбирается перебором, предыдущий ключ проверяется последним
+    legacy_previous_token = jwt.encode({"user_id": "1", "type": "access", "exp": expires_at},
+                                       previous_private_pem, algorithm=TOKEN_ALGORITHM)
+
+    stored = generate_hashed_password("bench-password")
+    response = Response()
+    hasher = PasswordHasher(executor_type="thread", max_workers=4, max_queue_size=1024)
+
+    reference_payload = {"user_id": "1", "type": "access", "jti": "0" * 32, "blob": "x" * 2048}
+
+    return [
+        # Эталон: не зависит от кода сервиса, по нему нормируются остальные результаты при --check
+        Benchmark(REFERENCE_BENCHMARK,
+                  lambda: hashlib.sha256(json.dumps(reference_payload).encode()).hexdigest(), 500, FAST_ROUNDS),
+        *build_engine_benchmarks(current_private_pem, current_public_pem, expires_at),
+        Benchmark("jwt.create_jwt_token", lambda: create_jwt_token(1, "access", signing_key, expires_at,
+                                                                   get_key_id(signing_key)), 100, FAST_ROUNDS),
+        Benchmark("jwt.decode_jwt", lambda: decode_jwt(current_token, current_public), 100, FAST_ROUNDS),
+        Benchmark("jwt.decode_with_public_keys.current_kid",
+                  lambda: decode_token_with_public_keys(current_token, public_keys), 100, FAST_ROUNDS),
+        Benchmark("jwt.decode_with_public_keys.previous_kid",
+                  lambda: decode_token_with_public_keys(previous_token, public_keys), 100, FAST_ROUNDS),
+        Benchmark("jwt.decode_with_public_keys.previous_no_kid",
+                  lambda: decode_token_with_public_keys(legacy_previous_token, public_keys), 50, FAST_ROUNDS),
+        Benchmark("bcrypt.generate_hashed_password", lambda: generate_hashed_password("bench-password"), 2, 3,
+                  async_func=lambda: hasher.hash_password("bench-password"), concurrency_ops=1),
+        Benchmark("bcrypt.check_password",
+                  lambda: check_password("bench-password", stored["hashed_password"], stored["salt"]), 2, 3,
+                  async_func=lambda: hasher.check_password("bench-password", stored["hashed_password"],
+                                                           stored["salt"]), concurrency_ops=1),
+        Benchmark("cookies.set_token_cookie",
+                  lambda: set_token_cookie(response, "access", current_token), 1000, FAST_ROUNDS),
+    ]
+
+
+def build_engine_benchmarks(private_pem: str, public_pem: str, expires_at: datetime) -> list[Benchmark]:
+    """Сравнение реализаций JWT_ENGINE на одних и тех же ключах.
+    Для подписи режим executor показывает вариант JWT_SIGN_OFF_LOOP"""
+    benchmarks = []
+    claims = {"user_id": "1", "type": "access", "jti": "0" * 32, "exp": expires_at}
+    for engine, codec_class in JWT_ENGINES.items():
+        codec = codec_class()
+        private_key, public_key = codec.load_key(private_pem), codec.load_key(public_pem)
+        token = codec.encode(claims, private_key, "bench")
+        benchmarks += [
+            Benchmark(f"jwt_engine.{engine}.encode", lambda c=codec, k=private_key: c.encode(claims, k, "bench"),
+                      100, FAST_ROUNDS,
+                      async_func=lambda c=codec, k=private_key: asyncio.to_thread(c.encode, claims, k, "bench")),
+            Benchmark(f"jwt_engine.{engine}.decode",
+                      lambda c=codec, k=public_key, t=token: c.decode(t, k), 100, FAST_ROUNDS),
+        ]
+    return benchmarks
+
+
+def run_single(benchmark: Benchmark) -> dict:
+    """Однопоточный режим: время одной операции по раундам"""
+    benchmark.func()  # прогрев
+    per_op = []
+    for _ in range(benchmark.rounds):
+        started = time.perf_counter()
+        for _ in range(benchmark.number):
+            benchmark.func()
+        per_op.append((time.perf_counter() - started) / benchmark.number)
+    median = statistics.median(per_op)
+    return {
+        "median_us": round(median * 1e6, 2),
+        "min_us": round(min(per_op) * 1e6, 2),
+        "stdev_us": round(statistics.stdev(per_op) * 1e6, 2) if len(per_op) > 1 else 0.0,
+        "ops_per_s": round(1 / median, 1),
+    }
+
+
+async def run_concurrent(operation: Callable[[], Awaitable[object]], concurrency: int, ops_per_task: int) -> dict:
+    """Режим asyncio: concurrency задач выполняют операцию, параллельно "пульс" измеряет блокировку event loop"""
+    interval = 0.001
+    lags = []
+    stop = asyncio.Event()
+
+    async def heartbeat():
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(max(0.0, time.perf_counter() - started - interval))
+
+    async def worker():
+        for _ in range(ops_per_task):
+            await operation()
+            await asyncio.sleep(0)
+
+    pulse = asyncio.create_task(heartbeat())
+    await asyncio.sleep(interval * 5)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await pulse
+
+    lags.sort()
+    return {
+        "concurrency": concurrency,
+        "ops_per_s": round(concurrency * ops_per_task / elapsed, 1),
+        "loop_block_p99_ms": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 3) if lags else None,
+        "loop_block_max_ms": round(lags[-1] * 1000, 3) if lags else None,
+    }
+
+
+async def run_asyncio(benchmark: Benchmark, concurrency: int) -> dict:
+    ops_per_task = benchmark.concurrency_ops or benchmark.number
+
+    async def blocking():
+        benchmark.func()
+
+    result = {"inline": await run_concurrent(blocking, concurrency, ops_per_task)}
+    if benchmark.async_func is not None:
+        result["executor"] = await run_concurrent(benchmark.async_func, concurrency, ops_per_task)
+    return result
+
+
+def relative_time(results: dict, name: str) -> float:
+    """Минимальное время операции в единицах эталона того же запуска (если эталон есть — иначе в мкс)"""
+    reference = results.get(REFERENCE_BENCHMARK)
+    value = results[name]["single"]["min_us"]
+    if reference is None or name == REFERENCE_BENCHMARK:
+        return value
+    return value / reference["single"]["min_us"]
+
+
+def slowdowns(results: dict, baseline: dict) -> dict[str, float]:
+    """Отношение текущего времени к baseline для бенчмарков, которые есть в обоих запусках"""
+    previous_results = baseline.get("results", {})
+    normalized = REFERENCE_BENCHMARK in results and REFERENCE_BENCHMARK in previous_results
+    ratios = {}
+    for name in results:
+        if name == REFERENCE_BENCHMARK or name not in previous_results:
+            continue
+        if normalized:
+            ratios[name] = relative_time(results, name) / relative_time(previous_results, name)
+        else:
+            ratios[name] = results[name]["single"]["min_us"] / previous_results[name]["single"]["min_us"]
+    return ratios
+
+
+def check_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Печатает сравнение с baseline и возвращает бенчмарки, замедлившиеся больше threshold"""
+    suspects = []
+    previous_results = baseline.get("results", {})
+    if REFERENCE_BENCHMARK in previous_results and REFERENCE_BENCHMARK in results:
+        print(f"Minimum per operation normalized by {REFERENCE_BENCHMARK}")
+    else:
+        print(f"Minimum per operation, not normalized: no {REFERENCE_BENCHMARK} in the baseline")
+    for name, ratio in slowdowns(results, baseline).items():
+        status = "REGRESSION?" if ratio > 1 + threshold else "ok"
+        print(f"{name:<48} {previous_results[name]['single']['min_us']:>12} -> {results[name]['single']['min_us']:>12} "
+              f"us ({(ratio - 1) * 100:+6.1f}%) {status}")
+        if status != "ok":
+            suspects.append(name)
+    return suspects
+
+
+def confirm_regressions(benchmarks: dict[str, Benchmark], suspects: list[str], baseline: dict,
+                        threshold: float, runs: int) -> list[str]:
+    """Повторно замеряет подозрительные бенчмарки вместе с эталоном.
+    Регрессия подтверждается, только если замедление воспроизвелось в каждом повторе"""
+    confirmed = list(suspects)
+    for attempt in range(1, runs + 1):
+        if not confirmed:
+            break
+        rerun = {name: {"single": run_single(benchmarks[name])} for name in [REFERENCE_BENCHMARK, *confirmed]
+                 if name in benchmarks}
+        ratios = slowdowns(rerun, baseline)
+        confirmed = [name for name in confirmed if ratios.get(name, 0) > 1 + threshold]
+        print(f"Re-run {attempt}/{runs}: " + ", ".join(f"{name} {(ratios[name] - 1) * 100:+.1f}%" for name in ratios))
+    return confirmed
+
+
+def print_table(results: dict) -> None:
+    print(f"{'benchmark':<48} {'median us':>12} {'ops/s':>10} "
+          f"{'inline block max ms':>20} {'executor block max ms':>22}")
+    for name, result in results.items():
+        executor = result["asyncio"].get("executor", {}).get("loop_block_max_ms", "-")
+        inline = result["asyncio"].get("inline", {}).get("loop_block_max_ms", "-")
+        print(f"{name:<48} {result['single']['median_us']:>12} {result['single']['ops_per_s']:>10} "
+              f"{inline:>20} {executor:>22}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Crypto and hashing microbenchmarks")
+    parser.add_argument("--filter", help="run only benchmarks whose name contains this substring")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent tasks in asyncio mode")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--check", action="store_true", help="compare with the baseline, exit 1 on regression")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed slowdown of the normalized minimum relative to the baseline (0.25 = 25%%)")
+    parser.add_argument("--confirm-runs", type=int, default=DEFAULT_CONFIRM_RUNS,
+                        help="re-runs that must all reproduce a slowdown before it counts as a regression")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true", help="overwrite the baseline with this run")
+    args = parser.parse_args()
+
+    results = {}
+    benchmarks = {benchmark.name: benchmark for benchmark in build_benchmarks()}
+    for benchmark in benchmarks.values():
+        if benchmark.name == REFERENCE_BENCHMARK:
+            # Эталон нужен для нормирования при любом --filter; в режиме asyncio он не интересен
+            results[benchmark.name] = {"single": run_single(benchmark), "asyncio": {}}
+            continue
+        if args.filter and args.filter not in benchmark.name:
+            continue
+        results[benchmark.name] = {"single": run_single(benchmark),
+                                   "asyncio": asyncio.run(run_asyncio(benchmark, args.concurrency))}
+
+    report = {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+    print_table(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        suspects = check_regressions(results, baseline, args.threshold)
+        regressions = confirm_regressions(benchmarks, suspects, baseline, args.threshold, args.confirm_runs)
+        if regressions:
+            print(f"Regressions over {args.threshold:.0%}: {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import os
+
+# Обязательные настройки приложения, чтобы импорт app.* не требовал .env
+for name, value in {
+    "LOG_LEVEL": "WARNING",
+    "DB_HOST": "localhost", "DB_PORT": "5432", "DB_USER": "test", "DB_PASS": "test", "DB_NAME": "test",
+    "REDIS_URL": "redis://localhost:6379/0",
+    "SMTP_HOST": "localhost", "SMTP_PORT": "1025", "SMTP_SENDER": "test@example.com", "SMTP_PASSWORD": "",
+    "VERIFICATION_TOKEN_EXPIRE_TIME_MINUTES": "60",
+    "ACCESS_TOKEN_EXPIRE_TIME_MINUTES": "15",
+    "REFRESH_TOKEN_EXPIRE_TIME_MINUTES": "1440",
+    "ACCESS_PRIVATE_KEY": "", "ACCESS_PUBLIC_KEY": "", "PREVIOUS_ACCESS_PUBLIC_KEY": "",
+    "REFRESH_PRIVATE_KEY": "", "REFRESH_PUBLIC_KEY": "", "PREVIOUS_REFRESH_PUBLIC_KEY": "",
+    "GOOGLE_CLIENT_ID": "", "GOOGLE_CLIENT_SECRET": "", "YANDEX_CLIENT_ID": "", "YANDEX_CLIENT_SECRET": "",
+}.items():
+    os.environ.setdefault(name, value)
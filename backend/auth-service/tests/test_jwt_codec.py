@@ -0,0 +1,162 @@
+import base64
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from app.exceptions import TokenExpired, TokenInvalid
+from app.utils.jwt_codec import JWT_ENGINES, CryptographyCodec
+
+ENGINES = list(JWT_ENGINES)
+
+
+def generate_pem_pair(curve: ec.EllipticCurve = ec.SECP256R1()) -> tuple[str, str]:
+    private_key = ec.generate_private_key(curve)
+    private_pem = private_key.private_bytes(serialization.Encoding.PEM,
+                                            serialization.PrivateFormat.TraditionalOpenSSL,
+                                            serialization.NoEncryption()).decode()
+    public_pem = private_key.public_key().public_bytes(serialization.Encoding.PEM,
+                                                       serialization.PublicFormat.SubjectPublicKeyInfo).decode()
+    return private_pem, public_pem
+
+
+def b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def b64url_json(value: dict) -> str:
+    return b64url(json.dumps(value).encode())
+
+
+def expires_in(seconds: int) -> datetime:
+    return (datetime.now(timezone.utc) + timedelta(seconds=seconds)).replace(tzinfo=None)
+
+
+@pytest.fixture(scope="module")
+def pem_pair() -> tuple[str, str]:
+    return generate_pem_pair()
+
+
+def make_token(engine: str, pem_pair: tuple[str, str], **claims) -> str:
+    codec = JWT_ENGINES[engine]()
+    claims = {"user_id": "1", "type": "access", "jti": "a" * 32, "exp": expires_in(60), **claims}
+    return codec.encode(claims, codec.load_key(pem_pair[0]), "kid-1")
+
+
+def decode(engine: str, pem_pair: tuple[str, str], token: str) -> dict:
+    codec = JWT_ENGINES[engine]()
+    return codec.decode(token, codec.load_key(pem_pair[1]))
+
+
+@pytest.mark.parametrize("encoder", ENGINES)
+@pytest.mark.parametrize("decoder", ENGINES)
+def test_round_trip_between_engines(pem_pair, encoder, decoder):
+    exp = expires_in(60)
+    token = make_token(encoder, pem_pair, exp=exp)
+
+    claims = decode(decoder, pem_pair, token)
+
+    assert claims["user_id"] == "1"
+    assert claims["type"] == "access"
+    assert claims["exp"] == int(exp.replace(tzinfo=timezone.utc).timestamp())
+    assert JWT_ENGINES[decoder]().get_unverified_header(token)["kid"] == "kid-1"
+
+
+def test_public_jwk_matches_between_engines(pem_pair):
+    jwks = [codec().public_jwk(codec().load_key(pem_pair[0])) for codec in JWT_ENGINES.values()]
+    assert all(jwk == jwks[0] for jwk in jwks)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_expired_token_is_rejected(pem_pair, engine):
+    token = make_token("cryptography", pem_pair, exp=expires_in(-60))
+    with pytest.raises(TokenExpired):
+        decode(engine, pem_pair, token)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tampered_payload_is_rejected(pem_pair, engine):
+    header, _, signature = make_token("cryptography", pem_pair).split(".")
+    payload = b64url_json({"user_id": "2", "type": "access", "exp": int(expires_in(60).timestamp())})
+    with pytest.raises(TokenInvalid):
+        decode(engine, pem_pair, f"{header}.{payload}.{signature}")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_tampered_signature_is_rejected(pem_pair, engine):
+    header, payload, signature = make_token("cryptography", pem_pair).split(".")
+    raw = bytearray(base64.urlsafe_b64decode(signature + "=" * (-len(signature) % 4)))
+    raw[-1] ^= 1
+    with pytest.raises(TokenInvalid):
+        decode(engine, pem_pair, f"{header}.{payload}.{b64url(bytes(raw))}")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_token_signed_by_other_key_is_rejected(pem_pair, engine):
+    token = make_token("cryptography", generate_pem_pair())
+    with pytest.raises(TokenInvalid):
+        decode(engine, pem_pair, token)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_alg_none_is_rejected(pem_pair, engine):
+    _, payload, _ = make_token("cryptography", pem_pair).split(".")
+    header = b64url_json({"alg": "none", "typ": "JWT"})
+    for token in (f"{header}.{payload}.", f"{header}.{payload}"):
+        with pytest.raises(TokenInvalid):
+            decode(engine, pem_pair, token)
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+def test_other_algorithm_in_header_is_rejected(pem_pair, engine):
+    _, payload, signature = make_token("cryptography", pem_pair).split(".")
+    header = b64url_json({"alg": "HS256", "typ": "JWT"})
+    with pytest.raises(TokenInvalid):
+        decode(engine, pem_pair, f"{header}.{payload}.{signature}")
+
+
+@pytest.mark.parametrize("engine", ENGINES)
+@pytest.mark.parametrize("token", [
+    "",
+    "not-a-token",
+    "a.b",
+    "a.b.c.d",
+    "!!!.???.***",
+    f"{b64url(b'not json')}.{b64url_json({})}.{b64url(bytes(64))}",
+    f"{b64url_json({'alg': 'ES256'})}.{b64url(b'[1, 2]')}.{b64url(bytes(64))}",
+])
+def test_malformed_token_is_rejected(pem_pair, engine, token):
+    with pytest.raises(TokenInvalid):
+        decode(engine, pem_pair, token)
+
+
+def test_signature_of_wrong_length_is_rejected(pem_pair):
+    header, payload, signature = make_token("cryptography", pem_pair).split(".")
+    with pytest.raises(TokenInvalid):
+        decode("cryptography", pem_pair, f"{header}.{payload}.{signature[:-4]}")
+
+
+def test_token_without_exp_is_rejected(pem_pair):
+    codec = CryptographyCodec()
+    token = codec.encode({"user_id": "1", "type": "access"}, codec.load_key(pem_pair[0]), "kid-1")
+    with pytest.raises(TokenInvalid):
+        codec.decode(token, codec.load_key(pem_pair[1]))
+
+
+def test_token_not_valid_yet_is_rejected(pem_pair):
+    token = make_token("cryptography", pem_pair, nbf=expires_in(60))
+    with pytest.raises(TokenInvalid):
+        decode("cryptography", pem_pair, token)
+
+
+def test_get_unverified_header_rejects_garbage():
+    with pytest.raises(TokenInvalid):
+        CryptographyCodec().get_unverified_header("garbage")
+
+
+@pytest.mark.parametrize("pem", ["", "not a key", generate_pem_pair(ec.SECP384R1())[0]])
+def test_load_key_rejects_invalid_keys(pem):
+    with pytest.raises(ValueError):
+        CryptographyCodec().load_key(pem)
@@ -0,0 +1,24 @@
+from app.config import Settings, settings
+from app.utils.key_manager import KeyManager, previous_key_name
+
+
+def test_settings_load_after_rotations_with_several_previous_keys(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(settings, "KEYS_PREVIOUS_TO_KEEP", 3)
+    key_manager = KeyManager()
+
+    for _ in range(4):
+        key_manager.rotate_keys()
+
+    # .env.keys содержит больше предыдущих ключей, чем полей в Settings
+    assert previous_key_name("ACCESS", 3) in key_manager.keys
+    assert len(key_manager.get_access_public_keys()) == 4
+    assert len(key_manager.get_refresh_public_keys()) == 4
+
+    # Ключи должны прийти из .env.keys, а не из окружения, заданного в conftest
+    for token_type in ("ACCESS", "REFRESH"):
+        for name in (f"{token_type}_PRIVATE_KEY", f"{token_type}_PUBLIC_KEY", previous_key_name(token_type, 1)):
+            monkeypatch.delenv(name, raising=False)
+    loaded = Settings()
+    assert loaded.ACCESS_PUBLIC_KEY == key_manager.keys["ACCESS_PUBLIC_KEY"]
+    assert loaded.PREVIOUS_ACCESS_PUBLIC_KEY == key_manager.keys["PREVIOUS_ACCESS_PUBLIC_KEY"]
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+import fakeredis
+import pytest
+import redis.asyncio as redis
+
+from app.db import redis as redis_db
+from app.models.users import User
+from app.repositories.usersCache import UsersCache
+
+
+@pytest.fixture
+def fake_redis_pool(monkeypatch):
+    pool = redis.ConnectionPool(connection_class=fakeredis.FakeAsyncRedisConnection, server=fakeredis.FakeServer(),
+                                decode_responses=True)
+    monkeypatch.setattr(redis_db, "redis_pool", pool)
+    return pool
+
+
+@pytest.fixture
+def users_cache(fake_redis_pool):
+    return UsersCache(enabled=True, local_ttl=30, redis_ttl=300, local_max_size=100, tombstone_ttl=10)
+
+
+def make_user(fullname: str) -> User:
+    return User(id=1, email="user@example.com", fullname=fullname, is_verified=True, role_id=1,
+                created_at=datetime(2026, 1, 1, tzinfo=timezone.utc))
+
+
+@pytest.mark.asyncio
+async def test_set_after_invalidation_does_not_cache_stale_row(users_cache):
+    # Читатель прочитал строку до коммита изменения, а записывает её в кэш уже после инвалидации
+    read_at = users_cache.read_started()
+    stale_user = make_user("Old Name")
+    await users_cache.invalidate([stale_user.id])
+    await users_cache.set(stale_user, read_at)
+
+    assert await users_cache.get(stale_user.id) is None
+    assert await users_cache.redis_repository.get_value(f"{UsersCache.KEY_PREFIX}{stale_user.id}") is None
+
+
+@pytest.mark.asyncio
+async def test_set_many_after_invalidation_on_another_replica_does_not_cache_stale_row(users_cache):
+    other_replica = UsersCache(enabled=True, local_ttl=30, redis_ttl=300, local_max_size=100, tombstone_ttl=10)
+    read_at = users_cache.read_started()
+    stale_user = make_user("Old Name")
+    # Локального надгробия у этой реплики нет, запись должна отклонить проверка в Redis
+    await other_replica.invalidate([stale_user.id])
+    await users_cache.set_many([stale_user], read_at)
+
+    assert await other_replica.get(stale_user.id) is None
+
+
+@pytest.mark.asyncio
+async def test_set_after_invalidation_caches_fresh_row(users_cache):
+    await users_cache.invalidate([1])
+    # Надгробие в Redis живёт tombstone_ttl; локальное время чтения уже после инвалидации
+    await users_cache.redis_repository.delete_keys(f"{UsersCache.TOMBSTONE_PREFIX}1")
+    read_at = users_cache.read_started()
+    await users_cache.set(make_user("New Name"), read_at)
+
+    cached = await users_cache.get(1)
+    assert cached is not None and cached.fullname == "New Name"
@@ -0,0 +1,277 @@
+"""Нагрузочный тест auth-service: виртуальные пользователи выполняют сценарии в заданной пропорции,
+по каждому маршруту считаются пропускная способность и перцентили задержки.
+
+Окружение (Postgres, Redis, SMTP-заглушка, сервис без rate limit):
+    docker compose -f docker-compose.yml -f loadtests/docker-compose.loadtest.yml up -d --build
+
+Запуск:
+    python loadtests/run.py --base-url http://localhost:8000 --users 50 --duration 60 \\
+        --mix browse=60,refresh=15,login=10,register=5,logout=10 --output loadtests/results/run.json
+    python loadtests/run.py ... --compare loadtests/results/baseline.json
+
+Результат — JSON: параметры запуска и для каждого маршрута count, errors, rps, p50/p95/p99/mean/max в мс."""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from http.cookies import SimpleCookie
+from typing import Optional
+
+import httpx
+
+PASSWORD = "loadtest-password"
+DEFAULT_MIX = "browse=60,refresh=15,login=10,register=5,logout=10"
+
+
+class Stats:
+    """Задержки и коды ответов по маршрутам за окно измерения (после прогрева)"""
+
+    def __init__(self, measure_from: float, measure_until: float):
+        self.measure_from = measure_from
+        self.measure_until = measure_until
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.statuses: dict[str, dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self.errors: dict[str, int] = defaultdict(int)
+
+    def record(self, route: str, started: float, latency: float, status: int, ok: bool) -> None:
+        # Учитываются запросы, начатые в окне измерения
+        if not self.measure_from <= started < self.measure_until:
+            return
+        self.latencies[route].append(latency)
+        self.statuses[route][status] += 1
+        if not ok:
+            self.errors[route] += 1
+
+    @staticmethod
+    def _percentile(sorted_values: list[float], percent: float) -> float:
+        # Метод ближайшего ранга
+        index = max(0, math.ceil(percent / 100 * len(sorted_values)) - 1)
+        return sorted_values[index]
+
+    def _summary(self, latencies: list[float], errors: int, duration: float) -> dict:
+        values = sorted(latencies)
+        return {
+            "count": len(values),
+            "errors": errors,
+            "rps": round(len(values) / duration, 2),
+            "p50_ms": round(self._percentile(values, 50) * 1000, 2),
+            "p95_ms": round(self._percentile(values, 95) * 1000, 2),
+            "p99_ms": round(self._percentile(values, 99) * 1000, 2),
+            "mean_ms": round(statistics.fmean(values) * 1000, 2),
+            "max_ms": round(values[-1] * 1000, 2),
+        }
+
+    def report(self, duration: float) -> dict:
+        routes = {route: {**self._summary(latencies, self.errors[route], duration),
+                          "statuses": dict(sorted(self.statuses[route].items()))}
+                  for route, latencies in sorted(self.latencies.items())}
+        all_latencies = [latency for latencies in self.latencies.values() for latency in latencies]
+        total = self._summary(all_latencies, sum(self.errors.values()), duration) if all_latencies else {}
+        return {"routes": routes, "total": total}
+
+
+class VirtualUser:
+    """Один клиент со своими cookies.
+    Cookies сервиса выставлены с флагом secure, а тест идёт по http, поэтому httpx их не отправил бы —
+    Set-Cookie разбирается и Cookie подставляется вручную."""
+
+    def __init__(self, client: httpx.AsyncClient, stats: Stats):
+        self.client = client
+        self.stats = stats
+        self.cookies: dict[str, str] = {}
+        self.email: Optional[str] = None
+
+    def _store_cookies(self, response: httpx.Response) -> None:
+        for header in response.headers.get_list("set-cookie"):
+            cookie = SimpleCookie()
+            cookie.load(header)
+            for name, morsel in cookie.items():
+                if morsel["max-age"] == "0" or not morsel.value or morsel.value == '""':
+                    self.cookies.pop(name, None)
+                else:
+                    self.cookies[name] = morsel.value
+
+    async def request(self, route: str, method: str, url: str, expected: tuple[int, ...] = (200,),
+                      **kwargs) -> Optional[httpx.Response]:
+        headers = {"user-agent": "auth-loadtest"}
+        if self.cookies:
+            headers["cookie"] = "; ".join(f"{name}={value}" for name, value in self.cookies.items())
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, url, headers=headers, **kwargs)
+        except httpx.HTTPError:
+            self.stats.record(route, started, time.perf_counter() - started, 0, ok=False)
+            return None
+        self.stats.record(route, started, time.perf_counter() - started, response.status_code,
+                          ok=response.status_code in expected)
+        self._store_cookies(response)
+        return response
+
+    async def register(self) -> bool:
+        self.email = f"loadtest-{uuid.uuid4().hex}@example.com"
+        response = await self.request("POST /auth/register", "POST", "/auth/register",
+                                      json={"email": self.email, "password": PASSWORD})
+        return response is not None and response.status_code == 200
+
+    async def login(self) -> bool:
+        response = await self.request("POST /auth/login", "POST", "/auth/login",
+                                      json={"email": self.email, "password": PASSWORD})
+        return response is not None and response.status_code == 200
+
+    async def protected(self) -> None:
+        await self.request("GET /auth/protected-auth-endpoint", "GET", "/auth/protected-auth-endpoint")
+
+    async def ensure_session(self) -> None:
+        if "refresh_token" not in self.cookies:
+            if not self.email:
+                await self.register()
+            else:
+                await self.login()
+
+
+async def scenario_browse(user: VirtualUser) -> None:
+    """Обычная работа с действующим access-токеном"""
+    await user.ensure_session()
+    for _ in range(3):
+        await user.protected()
+
+
+async def scenario_refresh(user: VirtualUser) -> None:
+    """Access-токен истёк: неявное обновление по refresh-токену"""
+    await user.ensure_session()
+    user.cookies.pop("access_token", None)
+    await user.request("GET /auth/protected-auth-endpoint (refresh)", "GET", "/auth/protected-auth-endpoint")
+
+
+async def scenario_login(user: VirtualUser) -> None:
+    if not user.email:
+        await user.register()
+    user.cookies.clear()
+    await user.login()
+    await user.protected()
+
+
+async def scenario_register(user: VirtualUser) -> None:
+    user.cookies.clear()
+    await user.register()
+    await user.protected()
+
+
+async def scenario_logout(user: VirtualUser) -> None:
+    await user.ensure_session()
+    await user.request("POST /auth/logout", "POST", "/auth/logout")
+    user.cookies.clear()
+
+
+SCENARIOS = {
+    "browse": scenario_browse,
+    "refresh": scenario_refresh,
+    "login": scenario_login,
+    "register": scenario_register,
+    "logout": scenario_logout,
+}
+
+
+def parse_mix(mix: str) -> dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in SCENARIOS:
+            raise SystemExit(f"Unknown scenario {name!r}, expected one of {', '.join(SCENARIOS)}")
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+async def run_user(client: httpx.AsyncClient, stats: Stats, weights: dict[str, float],
+                   deadline: float, rng: random.Random) -> None:
+    user = VirtualUser(client, stats)
+    names, values = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        await SCENARIOS[rng.choices(names, values)[0]](user)
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(result: dict, baseline: dict) -> None:
+    """Печатает изменение пропускной способности и p95 относительно другого прогона"""
+    print(f"{'route':<50} {'rps':>18} {'p95 ms':>22}")
+    for route, current in result["routes"].items():
+        previous = baseline.get("routes", {}).get(route)
+        if not previous:
+            print(f"{route:<50} {'new':>18}")
+            continue
+        rps_delta = (current["rps"] / previous["rps"] - 1) * 100 if previous["rps"] else 0
+        p95_delta = (current["p95_ms"] / previous["p95_ms"] - 1) * 100 if previous["p95_ms"] else 0
+        print(f"{route:<50} {current['rps']:>9} ({rps_delta:+6.1f}%) {current['p95_ms']:>11} ({p95_delta:+6.1f}%)")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Auth-service load test")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=20, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measurement starts")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="scenario weights, e.g. browse=60,login=10")
+    parser.add_argument("--seed", type=int, default=1, help="random seed for scenario choice")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="write JSON result to this file (default: stdout)")
+    parser.add_argument("--compare", help="previous JSON result to compare with")
+    args = parser.parse_args()
+
+    weights = parse_mix(args.mix)
+    measure_from = time.perf_counter() + args.warmup
+    deadline = measure_from + args.duration
+    stats = Stats(measure_from, deadline)
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout, limits=limits) as client:
+        await asyncio.gather(*(run_user(client, stats, weights, deadline, random.Random(args.seed + i))
+                               for i in range(args.users)))
+
+    result = {
+        "meta": {
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "base_url": args.base_url,
+            "users": args.users,
+            "duration_s": args.duration,
+            "warmup_s": args.warmup,
+            "mix": weights,
+            "seed": args.seed,
+        },
+        **stats.report(args.duration),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+    if not result["routes"]:
+        print("No requests were recorded", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
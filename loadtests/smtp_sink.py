@@ -0,0 +1,62 @@
+"""Заглушка SMTP-сервера для нагрузочных тестов: принимает любые письма и отбрасывает их.
+
+Запуск: python loadtests/smtp_sink.py [--host 0.0.0.0] [--port 1025]
+Поддерживает ровно столько SMTP, сколько нужно aiosmtplib без TLS: EHLO/HELO, AUTH, MAIL, RCPT, DATA, RSET, NOOP, QUIT."""
+import argparse
+import asyncio
+
+received = 0
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    global received
+    writer.write(b"220 smtp-sink ready\r\n")
+    await writer.drain()
+    try:
+        while line := await reader.readline():
+            command = line.decode("utf-8", "replace").strip().upper()
+            if command.startswith("EHLO"):
+                writer.write(b"250-smtp-sink\r\n250-AUTH PLAIN\r\n250 8BITMIME\r\n")
+            elif command.startswith("AUTH"):
+                writer.write(b"235 2.7.0 Authentication successful\r\n")
+            elif command.startswith("DATA"):
+                writer.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                await writer.drain()
+                while await reader.readline() not in (b".\r\n", b".\n", b""):
+                    pass
+                received += 1
+                writer.write(b"250 OK\r\n")
+            elif command.startswith("QUIT"):
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:  # HELO, MAIL, RCPT, RSET, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def report() -> None:
+    while True:
+        await asyncio.sleep(10)
+        print(f"smtp-sink: {received} messages received", flush=True)
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="SMTP sink for load tests")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    server = await asyncio.start_server(handle_client, args.host, args.port)
+    print(f"smtp-sink listening on {args.host}:{args.port}", flush=True)
+    asyncio.create_task(report())
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())